@@ -0,0 +1,149 @@
+"""
+Streaming export and import of whole collections, used by the export_docs
+and import_docs management commands.
+
+Documents are streamed through generator pipelines, so that memory usage
+doesn't depend on collection size:
+
+    export: batched cursor -> encode -> file
+    import: file -> decode -> validate with the document schema -> batched insert
+
+Inserts of a collection may be spread over several worker threads, while
+decoding and validation stay in the calling thread.
+"""
+import struct
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
+
+import bson
+from bson import json_util
+from bson.errors import InvalidBSON
+
+from app.cache import clear_document_caches
+from app.models import Tool, Author, Book
+from users.models import User, Token
+
+
+DOCUMENTS = OrderedDict([
+    ('tool', Tool),
+    ('author', Author),
+    ('book', Book),
+    ('user', User),
+    ('token', Token),
+])
+
+FORMATS = ('ndjson', 'bson')
+
+
+def iter_documents(document_cls, batch_size=1000):
+    """
+    Yields raw documents of the collection, fetching them in batches.
+    """
+    return document_cls._get_collection().find().batch_size(batch_size)
+
+
+def encode_ndjson(documents):
+    for document in documents:
+        yield (json_util.dumps(document) + '\n').encode('utf-8')
+
+
+def encode_bson(documents):
+    for document in documents:
+        yield bson.BSON.encode(document)
+
+
+def decode_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json_util.loads(line.decode('utf-8'))
+
+
+def decode_bson(stream):
+    """
+    Yields documents from a stream of concatenated BSON documents, like
+    the ones, written by mongodump. Each document starts with its length.
+    """
+    while True:
+        header = stream.read(4)
+        if not header:
+            return
+        if len(header) < 4:
+            raise InvalidBSON("Truncated document length")
+        length, = struct.unpack('<i', header)
+        body = stream.read(length - 4)
+        if len(body) < length - 4:
+            raise InvalidBSON("Truncated document: %d of %d bytes" % (len(body) + 4, length))
+        yield bson.BSON(header + body).decode()
+
+
+ENCODERS = {'ndjson': encode_ndjson, 'bson': encode_bson}
+DECODERS = {'ndjson': decode_ndjson, 'bson': decode_bson}
+
+
+def load_documents(document_cls, raw_documents):
+    """
+    Converts raw documents to validated instances of document_cls.
+    """
+    for raw_document in raw_documents:
+        document = document_cls._from_son(raw_document, created=True)
+        document.validate()
+        yield document
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_collection(document_cls, stream, format='ndjson', batch_size=1000):
+    """
+    Writes all documents of the collection to a binary stream. Returns the number of documents.
+    """
+    count = 0
+    for chunk in ENCODERS[format](iter_documents(document_cls, batch_size)):
+        stream.write(chunk)
+        count += 1
+    return count
+
+
+def import_collection(document_cls, stream, format='ndjson', batch_size=1000, workers=1):
+    """
+    Inserts documents from a binary stream into the collection with the given
+    number of worker threads. Returns the number of documents.
+
+    Bulk inserts don't send save signals, so caches of the documents are
+    cleared afterwards, also if the import fails.
+    """
+    def insert(batch):
+        document_cls.objects.insert(batch, load_bulk=False)
+        return len(batch)
+
+    try:
+        documents = load_documents(document_cls, DECODERS[format](stream))
+        if workers <= 1:
+            return sum(insert(batch) for batch in batches(documents, batch_size))
+
+        count = 0
+        pending = deque()
+        pool = ThreadPool(workers)
+        try:
+            for batch in batches(documents, batch_size):
+                # keep at most 2 batches per worker in memory
+                if len(pending) >= 2 * workers:
+                    count += pending.popleft().get()
+                pending.append(pool.apply_async(insert, (batch,)))
+            while pending:
+                count += pending.popleft().get()
+        finally:
+            pool.close()
+            pool.join()
+        return count
+    finally:
+        clear_document_caches(document_cls)
@@ -0,0 +1,198 @@
+"""
+Read-through cache of raw documents, keyed by primary key.
+
+Raw documents (dicts, as returned by pymongo) are kept in a bounded
+in-process LRU and, optionally, in a shared Django cache. Callers build
+documents from them with Document._from_son(), so cached values must not
+be mutated in place.
+
+Save and delete signals invalidate single documents. Code, that writes
+without signals (raw or bulk inserts, drops), must call invalidate() or
+clear_document_caches().
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from project.metrics import document_cache_requests
+
+
+# document class: its DocumentCaches
+DOCUMENT_CACHES = {}
+
+
+def clear_document_caches(document_cls):
+    for cache in DOCUMENT_CACHES.get(document_cls, ()):
+        cache.clear()
+
+
+class LRUCache(object):
+    """
+    Thread-safe LRU cache with a capacity and per-entry expiration time.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                return None
+            # re-insert as the most recently used one
+            self.entries[key] = entry
+            return value
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, value)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DocumentCache(object):
+    """
+    Caches raw documents of document_cls. Settings, named by the prefix:
+
+    * <prefix>_SIZE - capacity of the in-process LRU, 0 disables caching
+    * <prefix>_TTL - seconds, after which a cached document is fetched again;
+      it bounds staleness of LRUs of other processes, that don't see invalidations
+    * <prefix>_SHARED - alias of a cache from CACHES, shared by processes, or None
+    """
+    def __init__(self, document_cls, prefix):
+        self.document_cls = document_cls
+        self.prefix = prefix
+        self.local = LRUCache(0)
+        # changed by every invalidation, so that a document, fetched before it, isn't cached
+        self.generations = itertools.count()
+        self.generation = next(self.generations)
+        name = document_cls._get_collection_name()
+        self.local_hits = document_cache_requests.labels(name, 'local')
+        self.shared_hits = document_cache_requests.labels(name, 'shared')
+        self.misses = document_cache_requests.labels(name, 'miss')
+        DOCUMENT_CACHES.setdefault(document_cls, []).append(self)
+
+    def get_setting(self, name, default):
+        return getattr(settings, '%s_%s' % (self.prefix, name), default)
+
+    def get_shared(self):
+        alias = self.get_setting('SHARED', None)
+        return caches[alias] if alias is not None else None
+
+    def get_namespace_key(self):
+        return '%s:namespace' % self.document_cls._get_collection_name()
+
+    def get_namespace(self, shared):
+        """
+        Returns the current namespace of keys in the shared cache, clear() moves to a new one.
+        """
+        namespace = shared.get(self.get_namespace_key())
+        if namespace is None:
+            shared.add(self.get_namespace_key(), 0, timeout=None)
+            namespace = shared.get(self.get_namespace_key(), 0)
+        return namespace
+
+    def get_shared_key(self, pk, namespace):
+        return '%s:%s:%s' % (self.document_cls._get_collection_name(), namespace, pk)
+
+    def fetch(self, pks):
+        return dict(
+            (raw['_id'], raw) for raw in self.document_cls._get_collection().find({'_id': {'$in': list(pks)}})
+        )
+
+    def get_many(self, pks):
+        """
+        Returns {pk: raw document} for the pks, that exist. Missing documents
+        are fetched with a single query.
+        """
+        size = self.get_setting('SIZE', 0)
+        if not size:
+            self.misses.inc(len(pks))
+            return self.fetch(pks)
+
+        now = time.time()
+        self.local.capacity = size
+        found = {}
+        missing = []
+        for pk in pks:
+            raw = self.local.get(pk, now)
+            if raw is None:
+                missing.append(pk)
+            else:
+                found[pk] = raw
+        self.local_hits.inc(len(found))
+        if not missing:
+            return found
+
+        ttl = self.get_setting('TTL', 60)
+        shared = self.get_shared()
+        if shared is not None:
+            namespace = self.get_namespace(shared)
+            shared_keys = dict((self.get_shared_key(pk, namespace), pk) for pk in missing)
+            for key, raw in shared.get_many(list(shared_keys)).items():
+                found[shared_keys[key]] = raw
+                self.local.set(shared_keys[key], raw, now + ttl)
+            missing = [pk for pk in missing if pk not in found]
+            self.shared_hits.inc(len(shared_keys) - len(missing))
+            if not missing:
+                return found
+
+        self.misses.inc(len(missing))
+        generation = self.generation
+        fetched = self.fetch(missing)
+        found.update(fetched)
+        if generation == self.generation:
+            for pk, raw in fetched.items():
+                self.local.set(pk, raw, now + ttl)
+            if shared is not None and fetched:
+                shared.set_many(
+                    dict((self.get_shared_key(pk, namespace), raw) for pk, raw in fetched.items()), timeout=ttl
+                )
+        return found
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def invalidate(self, pk):
+        self.generation = next(self.generations)
+        self.local.delete(pk)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.delete(self.get_shared_key(pk, self.get_namespace(shared)))
+
+    def clear(self):
+        """
+        Drops all cached documents, in the shared cache by moving to a new namespace.
+        """
+        self.generation = next(self.generations)
+        self.local.clear()
+        shared = self.get_shared()
+        if shared is not None:
+            try:
+                shared.incr(self.get_namespace_key())
+            except ValueError:
+                # the namespace key was evicted
+                shared.add(self.get_namespace_key(), 1, timeout=None)
+
+    def on_change(self, sender, document, **kwargs):
+        """
+        Handler for post_save and post_delete signals.
+        """
+        self.invalidate(document.pk)
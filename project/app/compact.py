@@ -0,0 +1,96 @@
+"""
+Memory-compact, read-only representation of documents for serialization.
+
+Building a mongoengine Document from a raw document creates an object with
+its own _data dict and change-tracking bookkeeping for the document and for
+every embedded document in it. Compact documents are thin views over the raw
+dicts instead: plain fields are read from the raw dict on access and embedded
+document lists are hydrated on first access into tuples of __slots__ objects.
+
+Serializers read them like documents, through attribute access.
+"""
+from app.models import Tool, ToolInput, ToolOutput
+
+_missing = object()
+
+
+def compact_fields(document_cls):
+    """
+    Returns {field name: (db field name, default)} of a document class.
+    """
+    return dict((name, (field.db_field, field.default)) for name, field in document_cls._fields.items())
+
+
+class CompactEmbeddedDocument(object):
+    """
+    Read-only __slots__ copy of a raw embedded document. Subclasses define
+    `fields = compact_fields(EmbeddedDocumentClass)` and `__slots__ = tuple(fields)`.
+    """
+    __slots__ = ()
+    fields = {}
+
+    def __init__(self, raw):
+        for name, (db_field, default) in self.fields.items():
+            value = raw.get(db_field, _missing)
+            if value is _missing:
+                value = default() if callable(default) else default
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+
+class CompactDocument(object):
+    """
+    Read-only view over a raw document. Subclasses define `fields = compact_fields(DocumentClass)`
+    and map names of embedded document list fields to CompactEmbeddedDocument subclasses in `embedded`.
+    """
+    __slots__ = ('_raw', '_hydrated')
+    fields = {}
+    embedded = {}
+
+    def __init__(self, raw):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_hydrated', None)
+
+    @property
+    def pk(self):
+        return self._raw.get('_id')
+
+    def __getattr__(self, name):
+        # called only for attributes, missing from slots and class
+        try:
+            db_field, default = self.fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+        if name in self.embedded:
+            if self._hydrated is None:
+                object.__setattr__(self, '_hydrated', {})
+            if name not in self._hydrated:
+                self._hydrated[name] = tuple(self.embedded[name](item) for item in self._raw.get(db_field) or ())
+            return self._hydrated[name]
+
+        value = self._raw.get(db_field, _missing)
+        if value is _missing:
+            return default() if callable(default) else default
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+
+class CompactToolInput(CompactEmbeddedDocument):
+    fields = compact_fields(ToolInput)
+    __slots__ = tuple(fields)
+
+
+class CompactToolOutput(CompactEmbeddedDocument):
+    fields = compact_fields(ToolOutput)
+    __slots__ = tuple(fields)
+
+
+class CompactTool(CompactDocument):
+    __slots__ = ()
+    fields = compact_fields(Tool)
+    embedded = {'inputs': CompactToolInput, 'outputs': CompactToolOutput}
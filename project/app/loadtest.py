@@ -0,0 +1,298 @@
+"""
+Load-test scenario runner, used by the loadtest management command.
+
+Workers replay a weighted mix of API requests against the WSGI application
+from project/wsgi.py in-process, each request going through the whole
+middleware, authentication, throttling and serialization stack. Every
+request is recorded as (finish time, scenario, latency, status) and the
+records are summarized per time interval and per scenario. Requests, that
+raised an exception, have its class name as status.
+"""
+from __future__ import division
+
+import json
+import multiprocessing
+import random
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
+from wsgiref.util import setup_testing_defaults
+
+import bson
+from bson.dbref import DBRef
+from mongoengine import connection, DEFAULT_CONNECTION_NAME
+
+from django.conf import settings
+
+from app.bulk import DOCUMENTS
+from app.cache import clear_document_caches
+from app.models import Tool, Author, Book
+from project.benchmarks import sample_tool
+from users.models import User, Token
+
+
+USERNAME = 'loadtest@example.com'
+PASSWORD = 'loadtest'
+
+
+def use_database(name, client=None):
+    """
+    Points mongoengine to another database, e.g. a throwaway one, and optionally
+    to another client, e.g. mongomock.MongoClient(). Must be called before
+    the first query in a process, that inherited an open connection.
+
+    The default connection is re-registered rather than switched per document
+    with switch_db, because switch_db of mongoengine 0.9 opens the original
+    connection first.
+    """
+    connection.disconnect(DEFAULT_CONNECTION_NAME)
+    connection.register_connection(
+        DEFAULT_CONNECTION_NAME, name=name, host=settings.MONGODB_DATABASES['default']['host']
+    )
+    if client is not None:
+        # mongoengine 0.9 can't be given a client, so it is put into its private
+        # cache of connections; this depends on mongoengine.connection of 0.9
+        connection._connections[DEFAULT_CONNECTION_NAME] = client
+    # documents cache their collections, bound to the old connection
+    for document_cls in DOCUMENTS.values():
+        document_cls._collection = None
+
+
+def seed(tools=500, authors=50, books=500):
+    """
+    Fills the database with synthetic documents. Returns the context, that
+    scenarios need: the token of the user and ids of the tools.
+    """
+    for document_cls in DOCUMENTS.values():
+        document_cls.drop_collection()
+        # documents of a previous run must not be served from caches
+        clear_document_caches(document_cls)
+
+    user = User(id=1, username=USERNAME, email=USERNAME)
+    user.set_password(PASSWORD)
+    token = Token.objects.create(user=user)
+
+    raw_tools = []
+    for i in range(tools):
+        raw_tool = sample_tool(i)
+        raw_tool['_id'] = raw_tool.pop('id')
+        raw_tools.append(raw_tool)
+    Tool._get_collection().insert(raw_tools)
+
+    raw_authors = [{'_id': bson.ObjectId(), 'name': 'Author %d' % i} for i in range(authors)]
+    Author._get_collection().insert(raw_authors)
+    Book._get_collection().insert([{
+        'name': 'Book %d' % i,
+        'author': DBRef(Author._get_collection_name(), raw_authors[i % authors]['_id']),
+        'author_name': raw_authors[i % authors]['name'],
+    } for i in range(books)])
+
+    return {
+        'token': token.key,
+        'tool_ids': [raw_tool['_id'] for raw_tool in raw_tools],
+    }
+
+
+def authorization(context):
+    return {'HTTP_AUTHORIZATION': 'Token %s' % context['token']}
+
+
+def auth(context, rng):
+    return 'POST', '/api/auth/', {'username': USERNAME, 'password': PASSWORD}, {}
+
+
+def tool_list(context, rng):
+    return 'GET', '/api/tool/', None, authorization(context)
+
+
+def tool_retrieve(context, rng):
+    return 'GET', '/api/tool/%s/' % rng.choice(context['tool_ids']), None, authorization(context)
+
+
+def book_list(context, rng):
+    return 'GET', '/api/book/', None, authorization(context)
+
+
+def tool_write(context, rng):
+    label = 'Tool relabeled at %f' % time.time()
+    return 'PATCH', '/api/tool/%s/' % rng.choice(context['tool_ids']), {'label': label}, authorization(context)
+
+
+# scenario name: (default weight, request factory)
+SCENARIOS = OrderedDict([
+    ('auth', (1, auth)),
+    ('tool_list', (2, tool_list)),
+    ('tool_retrieve', (20, tool_retrieve)),
+    ('book_list', (4, book_list)),
+    ('tool_write', (3, tool_write)),
+])
+
+
+def call(application, method, path, data=None, headers=None):
+    """
+    Calls the WSGI application, consumes the response and returns its status code.
+    """
+    body = json.dumps(data).encode('utf-8') if data is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+    }
+    environ.update(headers or {})
+    setup_testing_defaults(environ)
+
+    statuses = []
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses.append(int(status.split(' ', 1)[0]))
+        return lambda data: None
+
+    result = application(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0]
+
+
+# a list, so that workers of a process print a traceback only once
+printed_tracebacks = []
+
+
+def run_worker(args):
+    """
+    Replays the request mix until the deadline. Returns a list of
+    (finish time, scenario, latency, status) records; status is the class name
+    of the exception for requests, that raised one. The traceback of the first
+    exception in the process is printed.
+    """
+    worker_id, context, mix, deadline, seed_value = args
+    from project.wsgi import application
+
+    rng = random.Random(seed_value + worker_id)
+    names = list(mix)
+    cumulative_weights = []
+    total = 0
+    for name in names:
+        total += mix[name]
+        cumulative_weights.append(total)
+
+    records = []
+    while time.time() < deadline:
+        point = rng.random() * total
+        name = next(name for name, weight in zip(names, cumulative_weights) if point < weight)
+        method, path, data, headers = SCENARIOS[name][1](context, rng)
+
+        start = time.time()
+        try:
+            status = call(application, method, path, data, headers)
+        except Exception as exc:
+            status = type(exc).__name__
+            if not printed_tracebacks:
+                printed_tracebacks.append(status)
+                sys.stderr.write("First exception, raised by %s %s (%s):\n" % (method, path, name))
+                traceback.print_exc()
+        finish = time.time()
+        records.append((finish, name, finish - start, status))
+    return records
+
+
+def init_process(database, overrides):
+    """
+    Initializes a forked worker process: it must not share the parent's Mongo connection.
+    """
+    from django.test.utils import override_settings
+
+    use_database(database)
+    override_settings(**overrides).enable()
+
+
+def run(context, mix, duration, workers, processes=False, database=None, overrides=None, seed_value=0):
+    """
+    Runs the load test with the given number of worker threads or processes
+    and returns records of all requests.
+    """
+    deadline = time.time() + duration
+    tasks = [(worker_id, context, mix, deadline, seed_value) for worker_id in range(workers)]
+
+    if processes:
+        pool = multiprocessing.Pool(workers, initializer=init_process, initargs=(database, overrides or {}))
+    else:
+        pool = ThreadPool(workers)
+    try:
+        results = pool.map(run_worker, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    return sorted((record for records in results for record in records), key=lambda record: record[0])
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def is_error(status):
+    return not isinstance(status, int) or (status >= 400 and status != 429)
+
+
+def summarize(records, seconds):
+    """
+    Returns throughput, latency percentiles (ms) and error rate of the records.
+    Any status >= 400, except 429 Too Many Requests, and exceptions are errors.
+    """
+    latencies = sorted(record[2] for record in records)
+    errors = len([record for record in records if is_error(record[3])])
+    throttled = len([record for record in records if record[3] == 429])
+    return OrderedDict([
+        ('requests', len(records)),
+        ('rps', len(records) / seconds if seconds else 0.0),
+        ('p50_ms', percentile(latencies, 50) * 1000),
+        ('p95_ms', percentile(latencies, 95) * 1000),
+        ('p99_ms', percentile(latencies, 99) * 1000),
+        ('errors_pct', errors / len(records) * 100 if records else 0.0),
+        ('throttled', throttled),
+    ])
+
+
+def summarize_intervals(records, start, interval):
+    """
+    Returns (interval start offset, summary) for each interval of the run.
+    """
+    buckets = OrderedDict()
+    for record in records:
+        buckets.setdefault(int((record[0] - start) // interval), []).append(record)
+    return [(number * interval, summarize(bucket, interval)) for number, bucket in buckets.items()]
+
+
+def summarize_scenarios(records, seconds):
+    scenarios = OrderedDict()
+    for record in records:
+        scenarios.setdefault(record[1], []).append(record)
+    return [(name, summarize(scenario_records, seconds)) for name, scenario_records in scenarios.items()]
+
+
+def summarize_errors(records):
+    """
+    Returns (scenario, {status or exception class: count}) for scenarios with errors.
+    """
+    scenarios = OrderedDict()
+    for record in records:
+        if is_error(record[3]):
+            errors = scenarios.setdefault(record[1], {})
+            errors[record[3]] = errors.get(record[3], 0) + 1
+    return list(scenarios.items())
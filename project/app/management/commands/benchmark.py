@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Runs micro-benchmarks from project.benchmarks and prints their results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Benchmarks to run: %s (default: all)" % ", ".join(BENCHMARKS))
+        parser.add_argument('--size', type=int, default=None,
+                            help="Number of documents in the dataset (default depends on the benchmark)")
+        parser.add_argument('--number', type=int, default=20, help="Number of timed iterations per measurement")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError("Unknown benchmark '%s', choose from: %s" % (name, ", ".join(BENCHMARKS)))
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING("%s:" % name))
+            for row in BENCHMARKS[name](options):
+                self.stdout.write("  " + "  ".join(self.format_cell(key, value) for key, value in row.items()))
+
+    def format_cell(self, key, value):
+        if isinstance(value, float):
+            return "%s=%.1f" % (key, value)
+        return "%s=%s" % (key, value)
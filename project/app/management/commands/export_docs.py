@@ -0,0 +1,45 @@
+from __future__ import division
+
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bulk import DOCUMENTS, FORMATS, export_collection
+
+
+class Command(BaseCommand):
+    help = "Streams documents of the given collections (default: all) to <output>/<collection>.<format> files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('collections', nargs='*', help="Collections: %s" % ", ".join(DOCUMENTS))
+        parser.add_argument('--output', default='.', help="Directory to write files to")
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', help="Newline-delimited JSON or BSON")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of documents per cursor batch")
+        parser.add_argument('--workers', type=int, default=1, help="Number of collections exported in parallel")
+
+    def handle(self, *args, **options):
+        names = options['collections'] or list(DOCUMENTS)
+        for name in names:
+            if name not in DOCUMENTS:
+                raise CommandError("Unknown collection '%s', choose from: %s" % (name, ", ".join(DOCUMENTS)))
+        if not os.path.isdir(options['output']):
+            os.makedirs(options['output'])
+
+        def export(name):
+            path = os.path.join(options['output'], '%s.%s' % (name, options['format']))
+            start = time.time()
+            with open(path, 'wb') as stream:
+                count = export_collection(DOCUMENTS[name], stream, options['format'], options['batch_size'])
+            return name, path, count, time.time() - start
+
+        start = time.time()
+        pool = ThreadPool(options['workers'])
+        try:
+            for name, path, count, seconds in pool.imap(export, names):
+                self.stdout.write("%s: %d documents to %s, %.0f docs/s" % (name, count, path, count / max(seconds, 1e-6)))
+        finally:
+            pool.close()
+            pool.join()
+        self.stdout.write(self.style.SUCCESS("Done in %.1f s" % (time.time() - start)))
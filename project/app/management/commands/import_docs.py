@@ -0,0 +1,61 @@
+from __future__ import division
+
+import os
+import time
+
+from bson.errors import InvalidBSON
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import NotUniqueError, ValidationError
+
+from app.bulk import DOCUMENTS, FORMATS, import_collection
+from app.cache import clear_document_caches
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams documents from <input>/<collection>.<format> files, written by export_docs, "
+        "validates them against the document schemas and inserts them in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('collections', nargs='*', help="Collections: %s (default: all with files)" % ", ".join(DOCUMENTS))
+        parser.add_argument('--input', default='.', help="Directory to read files from")
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', help="Newline-delimited JSON or BSON")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of documents per insert")
+        parser.add_argument('--workers', type=int, default=1, help="Number of threads, inserting batches of a collection")
+        parser.add_argument('--drop', action='store_true', help="Drop collections before import")
+
+    def get_path(self, name, options):
+        return os.path.join(options['input'], '%s.%s' % (name, options['format']))
+
+    def handle(self, *args, **options):
+        names = options['collections']
+        for name in names:
+            if name not in DOCUMENTS:
+                raise CommandError("Unknown collection '%s', choose from: %s" % (name, ", ".join(DOCUMENTS)))
+            if not os.path.isfile(self.get_path(name, options)):
+                raise CommandError("File %s doesn't exist" % self.get_path(name, options))
+        if not names:
+            names = [name for name in DOCUMENTS if os.path.isfile(self.get_path(name, options))]
+
+        start = time.time()
+        for name in names:
+            document_cls = DOCUMENTS[name]
+            if options['drop']:
+                document_cls.drop_collection()
+                clear_document_caches(document_cls)
+            collection_start = time.time()
+            try:
+                with open(self.get_path(name, options), 'rb') as stream:
+                    count = import_collection(
+                        document_cls, stream, options['format'], options['batch_size'], options['workers']
+                    )
+            except ValidationError as e:
+                raise CommandError("%s: invalid document: %s" % (name, e))
+            except NotUniqueError as e:
+                raise CommandError("%s: duplicate document, use --drop to replace the collection: %s" % (name, e))
+            except (InvalidBSON, ValueError) as e:
+                raise CommandError("%s: malformed %s file: %s" % (name, options['format'], e))
+            seconds = time.time() - collection_start
+            self.stdout.write("%s: %d documents, %.0f docs/s" % (name, count, count / max(seconds, 1e-6)))
+        self.stdout.write(self.style.SUCCESS("Done in %.1f s" % (time.time() - start)))
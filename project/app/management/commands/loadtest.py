@@ -0,0 +1,126 @@
+from __future__ import division
+
+import ast
+import copy
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from app import loadtest
+
+
+def parse_value(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_config(config):
+    """
+    Parses "name:SETTING=value,DICT_SETTING.KEY=value" into (name, settings overrides).
+    """
+    name, _, assignments = config.rpartition(':')
+    overrides = {}
+    for assignment in filter(None, assignments.split(',')):
+        key, sep, value = assignment.partition('=')
+        if not sep:
+            raise CommandError("Invalid setting assignment '%s', expected SETTING=value" % assignment)
+        if '.' in key:
+            key, item = key.split('.', 1)
+            overrides.setdefault(key, copy.deepcopy(getattr(settings, key, {})))[item] = parse_value(value)
+        else:
+            overrides[key] = parse_value(value)
+    return name or assignments, overrides
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a weighted mix of API requests against the WSGI application with concurrent workers "
+        "and reports throughput, latency percentiles and error rates over time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of concurrent workers")
+        parser.add_argument('--processes', action='store_true', help="Use worker processes instead of threads")
+        parser.add_argument('--duration', type=float, default=10, help="Duration of a run, seconds")
+        parser.add_argument('--interval', type=float, default=1, help="Reporting interval, seconds")
+        parser.add_argument('--mix', default='', help="Scenario weights, e.g. tool_retrieve=10,auth=0; scenarios: %s" %
+                            ", ".join("%s=%d" % (name, weight) for name, (weight, _) in loadtest.SCENARIOS.items()))
+        parser.add_argument('--mongomock', action='store_true', help="Run against in-memory mongomock instead of mongod")
+        parser.add_argument('--database', default='loadtest', help="Throwaway database, seeded with synthetic documents")
+        parser.add_argument('--tools', type=int, default=500, help="Number of seeded tools")
+        parser.add_argument('--books', type=int, default=500, help="Number of seeded books")
+        parser.add_argument('--throttle', action='store_true', help="Keep throttling on, it is disabled by default")
+        parser.add_argument('--config', action='append', default=[],
+                            help="Settings to compare, e.g. --config no-cache:TOOL_CACHE_SIZE=0 "
+                                 "--config cache:TOOL_CACHE_SIZE=1000; may be given several times")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed")
+
+    def get_mix(self, options):
+        mix = OrderedDict((name, weight) for name, (weight, _) in loadtest.SCENARIOS.items())
+        for item in filter(None, options['mix'].split(',')):
+            name, _, weight = item.partition('=')
+            if name not in mix:
+                raise CommandError("Unknown scenario '%s'" % name)
+            mix[name] = int(weight)
+        return OrderedDict((name, weight) for name, weight in mix.items() if weight > 0)
+
+    def handle(self, *args, **options):
+        if options['mongomock'] and options['processes']:
+            raise CommandError("In-memory mongomock database can't be shared by worker processes")
+
+        client = None
+        if options['mongomock']:
+            try:
+                import mongomock
+            except ImportError:
+                raise CommandError("--mongomock requires the mongomock package to be installed")
+            client = mongomock.MongoClient()
+        loadtest.use_database(options['database'], client)
+
+        mix = self.get_mix(options)
+        configs = [parse_config(config) for config in options['config']] or [('default', {})]
+        if not options['throttle']:
+            rest_framework = dict(getattr(settings, 'REST_FRAMEWORK', {}), DEFAULT_THROTTLE_RATES={})
+            for name, overrides in configs:
+                overrides.setdefault('REST_FRAMEWORK', rest_framework).update(DEFAULT_THROTTLE_RATES={})
+
+        totals = []
+        for name, overrides in configs:
+            with override_settings(**overrides):
+                context = loadtest.seed(tools=options['tools'], books=options['books'])
+                self.stdout.write(self.style.MIGRATE_HEADING("%s: %d %s for %.0f s, mix %s" % (
+                    name, options['workers'], "processes" if options['processes'] else "threads", options['duration'],
+                    ", ".join("%s=%d" % item for item in mix.items())
+                )))
+
+                start = time.time()
+                records = loadtest.run(
+                    context, mix, options['duration'], options['workers'], processes=options['processes'],
+                    database=options['database'], overrides=overrides, seed_value=options['seed']
+                )
+
+            self.write_table("t, s", loadtest.summarize_intervals(records, start, options['interval']))
+            self.write_table("scenario", loadtest.summarize_scenarios(records, options['duration']))
+            for scenario, errors in loadtest.summarize_errors(records):
+                self.stdout.write("%14s  errors: %s" % (scenario, ", ".join(
+                    "%s=%d" % item for item in sorted(errors.items(), key=lambda item: -item[1])
+                )))
+            totals.append((name, loadtest.summarize(records, options['duration'])))
+
+        if len(totals) > 1:
+            self.stdout.write(self.style.MIGRATE_HEADING("comparison:"))
+            self.write_table("config", totals)
+
+    def write_table(self, label, rows):
+        if not rows:
+            return
+        columns = list(rows[0][1])
+        self.stdout.write("%14s" % label + "".join("%12s" % column for column in columns))
+        for key, summary in rows:
+            cells = "".join(("%12.1f" if isinstance(value, float) else "%12d") % value for value in summary.values())
+            self.stdout.write("%14s" % key + cells)
@@ -0,0 +1,111 @@
+from __future__ import division
+
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# e.g. "import time:       245 |        312 |     rest_framework.settings"
+importtime_re = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\S+)\s*$')
+
+STARTUP_CODE = "import django; django.setup(); import %s"
+
+# Interpreters before 3.7 have no -X importtime, so __import__ is wrapped to
+# write the same lines. A module is reported by the import, that loaded it, and
+# its self time excludes nested imports. Imports of several modules at once,
+# e.g. of a package and its submodule, are reported by the deepest one.
+IMPORT_TIMER_CODE = '''
+import sys, time
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+_import, _claimed, _nested = builtins.__import__, set(), [0.0]
+
+def _timed_import(*args, **kwargs):
+    _nested.append(0.0)
+    start = time.time()
+    # modules are added to sys.modules before they run, so a module, that is being
+    # imported, must not be claimed by imports in its body
+    before = set(sys.modules)
+    try:
+        return _import(*args, **kwargs)
+    finally:
+        elapsed = time.time() - start
+        nested = _nested.pop()
+        _nested[-1] += elapsed
+        # implicit relative imports of Python 2 leave None in sys.modules
+        new = [name for name, module in list(sys.modules.items())
+               if module is not None and name not in before and name not in _claimed]
+        if new:
+            _claimed.update(new)
+            sys.stderr.write('import time: %d | %d | %s\\n' % (
+                (elapsed - nested) * 1e6, elapsed * 1e6, max(new, key=len)))
+
+builtins.__import__ = _timed_import
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Profiles cold start of a fresh interpreter with `python -X importtime` "
+        "(or a timing __import__ hook before Python 3.7), importing Django, the apps "
+        "and the given modules, and reports the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', help="Modules to import after django.setup() (default: ROOT_URLCONF)")
+        parser.add_argument('--runs', type=int, default=3, help="Number of interpreter runs to average")
+        parser.add_argument('--top', type=int, default=20, help="Number of slowest modules to report")
+        parser.add_argument('--packages', action='store_true', help="Aggregate times by top-level package")
+
+    def handle(self, *args, **options):
+        code = STARTUP_CODE % ", ".join(options['modules'] or [settings.ROOT_URLCONF])
+        if sys.version_info >= (3, 7):
+            command = [sys.executable, '-X', 'importtime', '-c', code]
+        else:
+            command = [sys.executable, '-c', IMPORT_TIMER_CODE + code]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'project.settings'))
+
+        self_times, cumulative_times = defaultdict(int), defaultdict(int)
+        wall_times = []
+        for _ in range(options['runs']):
+            start = time.time()
+            process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+            _, stderr = process.communicate()
+            wall_times.append(time.time() - start)
+            if process.returncode != 0:
+                raise CommandError("Import failed:\n%s" % stderr)
+
+            for line in stderr.splitlines():
+                match = importtime_re.match(line)
+                if not match:
+                    continue
+                self_us, cumulative_us, module = match.groups()
+                if options['packages']:
+                    # cumulative times of nested modules overlap, so only self times add up
+                    self_times[module.split('.')[0]] += int(self_us)
+                else:
+                    self_times[module] += int(self_us)
+                    cumulative_times[module] += int(cumulative_us)
+
+        runs = options['runs']
+        self.stdout.write("Cold start: %.0f ms on average over %d runs, %.0f ms best" % (
+            sum(wall_times) / runs * 1000, runs, min(wall_times) * 1000
+        ))
+        self.stdout.write("%10s %12s  %s" % ("self, ms", "cumul., ms", "module"))
+
+        slowest = sorted(self_times, key=lambda module: -self_times[module])[:options['top']]
+        for module in slowest:
+            cumulative = "%.1f" % (cumulative_times[module] / runs / 1000) if module in cumulative_times else "-"
+            self.stdout.write("%10.1f %12s  %s" % (self_times[module] / runs / 1000, cumulative, module))
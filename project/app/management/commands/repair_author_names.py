@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Author, Book
+
+
+def get_drift_pipeline():
+    """
+    Aggregation pipeline over books, that returns {_id: author id, name: author name, books: count}
+    for every author, whose books have a stale or missing author_name.
+    """
+    return [
+        {'$match': {'author': {'$ne': None}}},
+        # DBRef fields $ref/$id can't be used in field paths, so the id is extracted as the 2nd item of the DBRef
+        {'$addFields': {'author_id': {'$arrayElemAt': [{'$objectToArray': '$author'}, 1]}}},
+        {'$addFields': {'author_id': '$author_id.v'}},
+        {'$lookup': {
+            'from': Author._get_collection_name(),
+            'localField': 'author_id',
+            'foreignField': '_id',
+            'as': 'authors',
+        }},
+        {'$project': {
+            'author_id': 1,
+            'name': {'$ifNull': [{'$arrayElemAt': ['$authors.name', 0]}, None]},
+            'author_name': {'$ifNull': ['$author_name', None]},
+        }},
+        {'$project': {'author_id': 1, 'name': 1, 'drift': {'$ne': ['$author_name', '$name']}}},
+        {'$match': {'drift': True}},
+        {'$group': {'_id': '$author_id', 'name': {'$first': '$name'}, 'books': {'$sum': 1}}},
+    ]
+
+
+class Command(BaseCommand):
+    help = "Finds books with author_name, that differs from the name of their author, and fixes them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the drift")
+
+    def handle(self, *args, **options):
+        # without the cursor option pymongo 2.x sends an aggregate command, that MongoDB 3.6+ rejects
+        drifted = Book._get_collection().aggregate(get_drift_pipeline(), cursor={})
+
+        authors = books = 0
+        for author in drifted:
+            authors += 1
+            books += author['books']
+            self.stdout.write("author %s: %d book(s) to set author_name=%r" % (author['_id'], author['books'], author['name']))
+            if not options['dry_run']:
+                Book.objects(author=author['_id']).update(__raw__={'$set': {'author_name': author['name']}})
+
+        action = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS("%s %d book(s) of %d author(s)" % (action, books, authors)))
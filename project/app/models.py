@@ -1,13 +1,38 @@
-from mongoengine import Document, EmbeddedDocument, fields
+from bson.dbref import DBRef
+from mongoengine import Document, EmbeddedDocument, fields, signals
+
+from app.cache import DocumentCache
 
 
 class Author(Document):
     name = fields.StringField()
 
+    @classmethod
+    def post_save(cls, sender, document, **kwargs):
+        # keep denormalized names of the author's books in sync with a single multi-document update
+        Book.objects(author=document, author_name__ne=document.name).update(__raw__={
+            '$set': {'author_name': document.name}
+        })
+
 
 class Book(Document):
     name = fields.StringField()
     author = fields.ReferenceField(Author, dbref=True)
+    # denormalized Author.name, so that lists of books don't need to dereference authors;
+    # kept in sync by Author.post_save, drift is fixed by `manage.py repair_author_names`
+    author_name = fields.StringField(null=True)
+
+    @classmethod
+    def pre_save(cls, sender, document, **kwargs):
+        author = document.author
+        if isinstance(author, DBRef):
+            # books, loaded with no_dereference(), hold a DBRef
+            author = Author.objects(pk=author.id).only('name').first()
+        document.author_name = author.name if author is not None else None
+
+
+signals.post_save.connect(Author.post_save, sender=Author)
+signals.pre_save.connect(Book.pre_save, sender=Book)
 
 
 class ToolInput(EmbeddedDocument):
@@ -50,4 +75,30 @@ class Tool(Document):
     successCodes = fields.ListField(fields.IntField(), required=False)
     temporaryFailCodes = fields.ListField(fields.IntField(), required=False)
     permanentFailCodes = fields.ListField(fields.IntField(), required=False)
+    # incremented on every update, see app.updates
+    version = fields.IntField(default=0)
+
+    @classmethod
+    def get_by_id(cls, pk):
+        """
+        Returns the tool with the given id from tool_cache or raises Tool.DoesNotExist.
+        """
+        raw = tool_cache.get(pk)
+        if raw is None:
+            raise cls.DoesNotExist('Tool matching query does not exist.')
+        return cls._from_son(raw)
+
+    @classmethod
+    def get_by_ids(cls, pks):
+        """
+        Returns existing tools with the given ids from tool_cache in the order of ids.
+        """
+        raws = tool_cache.get_many(pks)
+        return [cls._from_son(raws[pk]) for pk in pks if pk in raws]
+
+
+# raw tools by id, invalidated on save/delete; see TOOL_CACHE_* settings
+tool_cache = DocumentCache(Tool, 'TOOL_CACHE')
 
+signals.post_save.connect(tool_cache.on_change, sender=Tool)
+signals.post_delete.connect(tool_cache.on_change, sender=Tool)
@@ -1,24 +1,113 @@
-from rest_framework import serializers
+from rest_framework import serializers, status, exceptions
 from rest_framework_mongoengine import serializers as mongoserializers
 
-from app.models import Tool, Author, Book
+from app.models import Tool, ToolInput, ToolOutput, Author, Book, tool_cache
+from app.updates import atomic_update, conditional_save
+from project.metrics_api import TimedSerializerMixin
 
 
-class ToolSerializer(mongoserializers.DocumentSerializer):
+class VersionConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Document was modified concurrently, reload it and retry.'
+
+
+class DynamicValueField(serializers.Field):
+    """
+    Value of a mongoengine DynamicField as is. Fields, generated for DynamicFields,
+    read the value from the document's _data, so they can't serialize compact
+    views of documents (see app.compact) and turn lists and dicts into strings.
+    """
+    def to_representation(self, value):
+        return value
+
+    def to_internal_value(self, data):
+        return data
+
+
+class ToolInputSerializer(mongoserializers.EmbeddedDocumentSerializer):
+    id = serializers.CharField()
+    type = serializers.ListField(child=DynamicValueField(allow_null=True), required=False)
+    default = DynamicValueField(required=False, allow_null=True)
+    inputBinding = DynamicValueField()
+
+    class Meta:
+        model = ToolInput
+        fields = '__all__'
+
+
+class ToolOutputSerializer(mongoserializers.EmbeddedDocumentSerializer):
+    id = serializers.CharField()
+    type = serializers.ListField(child=DynamicValueField(allow_null=True), required=False)
+    default = DynamicValueField(required=False, allow_null=True)
+    outputBinding = DynamicValueField(required=False, allow_null=True)
+
+    class Meta:
+        model = ToolOutput
+        fields = '__all__'
+
+
+class ToolSerializer(TimedSerializerMixin, mongoserializers.DocumentSerializer):
+    """
+    Partial updates (PATCH) are applied as atomic $set/$push/$pull operators
+    instead of rewriting the whole document. Both partial and full updates
+    are applied only to the version of the tool, that was loaded or given in
+    `version`, and fail with 409, if the stored one differs from it.
+    `version` is ignored on create, new tools start from 0.
+    """
     id = serializers.CharField(read_only=False)
+    version = serializers.IntegerField(required=False)
+    # embedded lists are nested as list fields, which DRF allows to write, unlike nested serializers
+    inputs = serializers.ListField(child=ToolInputSerializer(), required=False)
+    outputs = serializers.ListField(child=ToolOutputSerializer(), required=False)
+    baseCommand = DynamicValueField()
+    arguments = DynamicValueField()
+    requirements = DynamicValueField(allow_null=True)
+    hints = DynamicValueField(required=False, allow_null=True)
 
     class Meta:
         model = Tool
         fields = '__all__'
 
+    def create(self, validated_data):
+        validated_data.pop('version', None)
+        return super(ToolSerializer, self).create(validated_data)
+
+    def update(self, instance, validated_data):
+        version = validated_data.pop('version', None)
+        if validated_data.get('id', instance.id) != instance.id:
+            raise serializers.ValidationError({'id': ["Tool id can't be changed."]})
+        validated_data.pop('id', None)
+
+        if self.partial:
+            if not atomic_update(instance, validated_data, version):
+                raise VersionConflict()
+            # atomic updates bypass save(), so its signals don't invalidate the cache
+            tool_cache.invalidate(instance.pk)
+            instance.reload()
+            return instance
+
+        if version is None:
+            version = instance.version or 0
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if not conditional_save(instance, version):
+            raise VersionConflict()
+        tool_cache.invalidate(instance.pk)
+        return instance
+
 
-class AuthorSerializer(mongoserializers.DocumentSerializer):
+class AuthorSerializer(TimedSerializerMixin, mongoserializers.DocumentSerializer):
     class Meta:
         model = Author
         fields = '__all__'
 
 
-class BookSerializer(mongoserializers.DocumentSerializer):
+class BookSerializer(TimedSerializerMixin, mongoserializers.DocumentSerializer):
+    """
+    `author` is represented by id, which a DBRef holds as well, so books,
+    loaded with no_dereference(), are serialized without reading authors.
+    """
     class Meta:
         model = Book
         fields = '__all__'
+        read_only_fields = ('author_name',)
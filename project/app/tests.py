@@ -1,3 +1,355 @@
-from django.test import TestCase
+import datetime
+import subprocess
+import sys
+from io import BytesIO
 
-# Create your tests here.
+from bson.errors import InvalidBSON
+from mongoengine import NotUniqueError, ValidationError
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.utils.six import StringIO
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from app.bulk import ENCODERS, DECODERS, batches, export_collection, import_collection
+from app.cache import LRUCache
+from app.compact import CompactTool
+from app.loadtest import percentile, summarize, summarize_errors
+from app.management.commands.profile_imports import IMPORT_TIMER_CODE, importtime_re
+from app.models import Tool, ToolInput, Author, Book, tool_cache
+from app.serializers import ToolSerializer
+from app.updates import get_update, conditional_save
+from project.benchmarks import sample_tool
+
+
+class AtomicUpdateTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tool = Tool(id='tool', label='Tool', inputs=[self.get_input('a'), self.get_input('b')])
+
+    def get_input(self, id, label=None):
+        return ToolInput(id=id, label=label or id, inputBinding={'position': 1})
+
+    def test_set_changed_fields(self):
+        update = get_update(self.tool, {'label': 'New label', 'description': None})
+        self.assertEqual(update, {'$set': {'label': 'New label'}})
+
+    def test_push_added_items(self):
+        update = get_update(self.tool, {'inputs': self.tool.inputs + [self.get_input('c')]})
+        self.assertEqual(list(update), ['$push'])
+        self.assertEqual([item['id'] for item in update['$push']['inputs']['$each']], ['c'])
+
+    def test_pull_removed_items(self):
+        update = get_update(self.tool, {'inputs': [self.get_input('b')]})
+        self.assertEqual(update, {'$pull': {'inputs': {'id': {'$in': ['a']}}}})
+
+    def test_set_changed_items(self):
+        update = get_update(self.tool, {'inputs': [self.get_input('a'), self.get_input('b', 'B')]})
+        self.assertEqual(list(update['$set']), ['inputs.1'])
+        self.assertEqual(update['$set']['inputs.1']['label'], 'B')
+
+    def test_set_whole_list_on_mixed_changes(self):
+        update = get_update(self.tool, {'inputs': [self.get_input('b', 'B'), self.get_input('c')]})
+        self.assertEqual([item['id'] for item in update['$set']['inputs']], ['b', 'c'])
+
+    def test_skip_unchanged_list(self):
+        update = get_update(self.tool, {'inputs': [self.get_input('a'), self.get_input('b')]})
+        self.assertEqual(update, {})
+
+
+class ConditionalSaveTestCase(APITestCase):
+    def setUp(self):
+        tool = sample_tool(0, ports=0)
+        Tool._get_collection().insert(dict(tool, _id=tool.pop('id')))
+
+    def doCleanups(self):
+        Tool.drop_collection()
+        tool_cache.clear()
+
+    def test_save_loaded_version(self):
+        tool = Tool.objects.get(id='tool-0')
+        tool.label = 'Relabeled'
+
+        self.assertTrue(conditional_save(tool, 0))
+        self.assertEqual(tool.version, 1)
+        self.assertEqual(Tool.objects.get(id='tool-0').label, 'Relabeled')
+
+    def test_conflict_on_concurrent_update(self):
+        tool = Tool.objects.get(id='tool-0')
+        Tool.objects(id='tool-0').update_one(inc__version=1)
+        tool.label = 'Relabeled'
+
+        self.assertFalse(conditional_save(tool, 0))
+        self.assertEqual(Tool.objects.get(id='tool-0').label, 'Tool number 0')
+
+    def test_put(self):
+        data = dict(sample_tool(0, ports=0), label='Relabeled', version=0)
+        response = APIClient().put(reverse("api:tool-detail", kwargs={'id': 'tool-0'}), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(Tool.objects.get(id='tool-0').label, 'Relabeled')
+
+    def test_put_conflict(self):
+        data = dict(sample_tool(0, ports=0), label='Relabeled', version=5)
+        response = APIClient().put(reverse("api:tool-detail", kwargs={'id': 'tool-0'}), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_patch_with_unchanged_list(self):
+        tool = sample_tool(2, ports=2)
+        Tool._get_collection().insert(dict(tool, _id=tool.pop('id')))
+        data = {'label': 'Relabeled', 'inputs': tool['inputs'], 'version': 0}
+        response = APIClient().patch(reverse("api:tool-detail", kwargs={'id': 'tool-2'}), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(Tool.objects.get(id='tool-2').label, 'Relabeled')
+
+    def test_version_is_ignored_on_create(self):
+        data = dict(sample_tool(1, ports=0), version=5)
+        response = APIClient().post(reverse("api:tool-list"), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tool.objects.get(id='tool-1').version, 0)
+
+
+class BulkStreamsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.documents = [{'_id': 'tool-%d' % i, 'label': 'Tool %d' % i, 'created': datetime.datetime(2016, 1, i + 1)}
+                          for i in range(3)]
+
+    def round_trip(self, format):
+        stream = BytesIO(b''.join(ENCODERS[format](iter(self.documents))))
+        return list(DECODERS[format](stream))
+
+    def test_ndjson_round_trip(self):
+        documents = self.round_trip('ndjson')
+        self.assertEqual([document['_id'] for document in documents], ['tool-0', 'tool-1', 'tool-2'])
+        self.assertEqual(documents[2]['created'].day, 3)
+
+    def test_bson_round_trip(self):
+        self.assertEqual(self.round_trip('bson'), self.documents)
+
+    def test_batches(self):
+        self.assertEqual(list(batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+class ImportCollectionTestCase(APITestCase):
+    def setUp(self):
+        Author.objects.insert([Author(name='Author %d' % i) for i in range(5)])
+
+    def doCleanups(self):
+        Author.drop_collection()
+
+    def export(self, format='ndjson'):
+        stream = BytesIO()
+        export_collection(Author, stream, format)
+        stream.seek(0)
+        return stream
+
+    def test_round_trip(self):
+        for format in ('ndjson', 'bson'):
+            stream = self.export(format)
+            Author.drop_collection()
+
+            self.assertEqual(import_collection(Author, stream, format, batch_size=2, workers=2), 5)
+            self.assertEqual(sorted(Author.objects.scalar('name')), ['Author %d' % i for i in range(5)])
+
+    def test_invalid_document(self):
+        stream = BytesIO(b'{"_id": {"$oid": "57a2e54d1e2bd6a2a6d8b2c1"}, "name": 1}\n')
+
+        with self.assertRaises(ValidationError):
+            import_collection(Author, stream)
+
+    def test_duplicate_document(self):
+        with self.assertRaises(NotUniqueError):
+            import_collection(Author, self.export(), workers=2)
+
+    def test_truncated_bson(self):
+        stream = BytesIO(self.export('bson').getvalue()[:-3])
+        Author.drop_collection()
+
+        with self.assertRaises(InvalidBSON):
+            import_collection(Author, stream, 'bson')
+
+
+class AuthorNameDenormalizationTestCase(APITestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name="Leo Tolstoy")
+        self.book = Book.objects.create(name="War and Peace", author=self.author)
+
+    def doCleanups(self):
+        Author.drop_collection()
+        Book.drop_collection()
+
+    def test_name_is_copied_on_save(self):
+        self.assertEqual(Book.objects.get(id=self.book.id).author_name, "Leo Tolstoy")
+
+    def test_rename_updates_books(self):
+        self.author.name = "Lev Tolstoy"
+        self.author.save()
+
+        self.assertEqual(Book.objects.get(id=self.book.id).author_name, "Lev Tolstoy")
+
+    def test_list_books(self):
+        response = APIClient().get(reverse("api:book-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['author'], str(self.author.id))
+        self.assertEqual(response.data[0]['author_name'], "Leo Tolstoy")
+
+    def test_repair_drift(self):
+        Book.objects(id=self.book.id).update(__raw__={'$set': {'author_name': "Stale name"}})
+
+        call_command('repair_author_names', '--dry-run', stdout=StringIO())
+        self.assertEqual(Book.objects.get(id=self.book.id).author_name, "Stale name")
+
+        call_command('repair_author_names', stdout=StringIO())
+        self.assertEqual(Book.objects.get(id=self.book.id).author_name, "Leo Tolstoy")
+
+
+class LoadTestSummaryTestCase(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_summarize(self):
+        records = [(1.0, 'tool_list', 0.010, 200), (1.5, 'tool_list', 0.020, 500),
+                   (1.7, 'auth', 0.030, 429), (1.9, 'auth', 0.040, 'KeyError')]
+        summary = summarize(records, 2)
+
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['rps'], 2.0)
+        self.assertEqual(summary['errors_pct'], 50.0)
+        self.assertEqual(summary['throttled'], 1)
+
+    def test_summarize_errors(self):
+        records = [(1.0, 'tool_list', 0.010, 500), (1.5, 'tool_list', 0.020, 'KeyError'),
+                   (1.7, 'tool_list', 0.030, 'KeyError'), (1.9, 'auth', 0.040, 429), (2.0, 'auth', 0.040, 200)]
+
+        self.assertEqual(summarize_errors(records), [('tool_list', {500: 1, 'KeyError': 2})])
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1, expires=10)
+        cache.set('b', 2, expires=10)
+        cache.get('a', now=0)
+        cache.set('c', 3, expires=10)
+
+        self.assertEqual(cache.get('a', now=0), 1)
+        self.assertIsNone(cache.get('b', now=0))
+        self.assertEqual(cache.get('c', now=0), 3)
+
+    def test_expire(self):
+        cache = LRUCache(2)
+        cache.set('a', 1, expires=10)
+
+        self.assertEqual(cache.get('a', now=9), 1)
+        self.assertIsNone(cache.get('a', now=10))
+
+
+class ToolCacheTestCase(APITestCase):
+    def setUp(self):
+        for i in range(3):
+            tool = sample_tool(i, ports=2)
+            Tool._get_collection().insert(dict(tool, _id=tool.pop('id')))
+
+    def doCleanups(self):
+        Tool.drop_collection()
+        tool_cache.clear()
+
+    def test_invalidate_on_save(self):
+        tool = Tool.get_by_id('tool-0')
+        tool.label = 'Relabeled'
+        tool.save()
+
+        self.assertEqual(Tool.get_by_id('tool-0').label, 'Relabeled')
+
+    def test_clear(self):
+        with override_settings(TOOL_CACHE_SHARED='default'):
+            Tool.get_by_id('tool-0')
+            Tool._get_collection().update({'_id': 'tool-0'}, {'$set': {'label': 'Relabeled'}})
+            self.assertEqual(Tool.get_by_id('tool-0').label, 'Tool number 0')
+
+            tool_cache.clear()
+            self.assertEqual(Tool.get_by_id('tool-0').label, 'Relabeled')
+
+    def test_import_clears_cache(self):
+        Tool.get_by_id('tool-0')
+        tool = sample_tool(0, ports=2)
+        tool.update(_id=tool.pop('id'), label='Imported')
+        Tool.drop_collection()
+        import_collection(Tool, BytesIO(b''.join(ENCODERS['ndjson']([tool]))))
+
+        self.assertEqual(Tool.get_by_id('tool-0').label, 'Imported')
+
+    def test_retrieve(self):
+        response = APIClient().get(reverse("api:tool-detail", kwargs={'id': 'tool-1'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['label'], 'Tool number 1')
+
+    def test_multi_get(self):
+        response = APIClient().get(reverse("api:tool-multi"), {'ids': 'tool-2,missing,tool-0'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([tool['id'] for tool in response.data], ['tool-2', 'tool-0'])
+
+    @override_settings(TOOL_COMPACT_READS=True)
+    def test_compact_reads(self):
+        client = APIClient()
+        retrieved = client.get(reverse("api:tool-detail", kwargs={'id': 'tool-1'}))
+        listed = client.get(reverse("api:tool-list"))
+
+        self.assertEqual(retrieved.status_code, status.HTTP_200_OK)
+        self.assertEqual(retrieved.data['inputs'][1]['inputBinding'], {'position': 1, 'prefix': '--input-1'})
+        self.assertEqual(sorted(tool['id'] for tool in listed.data), ['tool-0', 'tool-1', 'tool-2'])
+
+
+class CompactToolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.raw = dict(sample_tool(1, ports=3))
+        self.raw['_id'] = self.raw.pop('id')
+
+    def test_serialize_like_document(self):
+        self.assertEqual(ToolSerializer(CompactTool(self.raw)).data, ToolSerializer(Tool._from_son(self.raw)).data)
+
+    def test_defaults(self):
+        del self.raw['successCodes']
+        tool = CompactTool(self.raw)
+
+        self.assertEqual(tool.successCodes, [])
+        self.assertEqual(tool.version, 0)
+
+    def test_read_only(self):
+        tool = CompactTool(self.raw)
+
+        with self.assertRaises(AttributeError):
+            tool.label = 'New label'
+        with self.assertRaises(AttributeError):
+            tool.inputs[0].label = 'New label'
+
+
+class ImportTimerTestCase(SimpleTestCase):
+    def test_report_loaded_modules(self):
+        process = subprocess.Popen(
+            [sys.executable, '-c', IMPORT_TIMER_CODE + 'import xml.dom.minidom; import wave'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        _, stderr = process.communicate()
+        matches = [importtime_re.match(line) for line in stderr.splitlines()]
+        modules = [match.group(3) for match in matches if match]
+
+        self.assertEqual(process.returncode, 0)
+        # each module is reported once, by the import, that loaded it
+        self.assertIn('xml.dom.minidom', modules)
+        self.assertIn('wave', modules)
+        self.assertEqual(len(modules), len(set(modules)))
+        for match in matches:
+            self.assertLessEqual(int(match.group(1)), int(match.group(2)))
@@ -0,0 +1,122 @@
+"""
+Partial document updates with atomic operators instead of a full rewrite.
+
+Documents, updated this way, must have an integer `version` field. Every
+update increments it and is applied only if the stored version still equals
+the one, the changes were computed against (optimistic concurrency).
+"""
+from collections import OrderedDict
+
+from mongoengine.fields import EmbeddedDocumentListField
+
+
+def get_list_update(db_field, field, old_items, new_items):
+    """
+    Returns update operators, that turn old_items of an embedded document list
+    into new_items, or {}, if they are equal. Items are matched by their `id`.
+
+    MongoDB doesn't allow several operators on the same path in one update,
+    so a single kind of change is expressed as $pull, $push or $set of changed
+    items, while mixed changes and reorderings $set the whole list.
+    """
+    to_mongo = field.field.to_mongo
+    old = OrderedDict((item.id, to_mongo(item)) for item in old_items)
+    new = OrderedDict((item.id, to_mongo(item)) for item in new_items)
+    whole_list = {'$set': {db_field: list(new.values())}}
+
+    if len(old) != len(old_items) or len(new) != len(new_items):
+        # ids are not unique, so items can't be addressed by them
+        return whole_list
+
+    kept = [key for key in new if key in old]
+    removed = [key for key in old if key not in new]
+    added = [key for key in new if key not in old]
+    changed = [key for key in kept if old[key] != new[key]]
+
+    # new items may only be appended and kept ones must keep their order
+    if kept != [key for key in old if key in new] or list(new)[:len(kept)] != kept:
+        return whole_list
+    if len([kind for kind in (removed, added, changed) if kind]) > 1:
+        return whole_list
+
+    if removed:
+        return {'$pull': {db_field: {'id': {'$in': removed}}}}
+    if added:
+        return {'$push': {db_field: {'$each': [new[key] for key in added]}}}
+    if not changed:
+        return {}
+
+    positions = dict((key, position) for position, key in enumerate(old))
+    return {'$set': dict(('%s.%d' % (db_field, positions[key]), new[key]) for key in changed)}
+
+
+def get_update(document, changes):
+    """
+    Returns a MongoDB update document, that applies the changes - a dict of
+    {field name: new value} - to the stored copy of the document.
+    """
+    update = {}
+    for name, value in changes.items():
+        field = document._fields[name]
+        old_value = getattr(document, name)
+
+        if isinstance(field, EmbeddedDocumentListField):
+            operators = get_list_update(field.db_field, field, old_value or [], value or [])
+        elif field.to_mongo(value) != field.to_mongo(old_value):
+            operators = {'$set': {field.db_field: field.to_mongo(value)}}
+        else:
+            continue
+
+        # MongoDB before 5.0 rejects operators without paths, e.g. an empty $set
+        for operator, paths in operators.items():
+            if paths:
+                update.setdefault(operator, {}).update(paths)
+
+    return update
+
+
+def get_version_query(document, version):
+    # documents, created before the version field was added, don't store it
+    return {'_id': document.pk, 'version': {'$in': [version, None]} if version == 0 else version}
+
+
+def atomic_update(document, changes, version=None):
+    """
+    Applies the changes to the stored document with a single update_one.
+
+    The version defaults to the one of the loaded document, so that changes,
+    made by someone else after it was loaded, are not overwritten. Returns
+    False, if the stored document has a different version.
+    """
+    if version is None:
+        version = document.version or 0
+
+    update = get_update(document, changes)
+    update['$inc'] = {'version': 1}
+
+    return document.__class__.objects(__raw__=get_version_query(document, version)).update_one(__raw__=update) == 1
+
+
+def conditional_save(document, version):
+    """
+    Saves changes of a loaded document, if the stored version still equals the
+    given one, and increments the version. Returns False otherwise.
+
+    It is Document.save(save_condition={'version': version}), except that
+    mongoengine 0.9 doesn't report, that the condition didn't match, so the
+    update is applied with update_one, that returns the number of matched
+    documents. Save signals are not sent.
+    """
+    document.validate()
+    updates, removals = document._delta()
+    update = {'$inc': {'version': 1}}
+    if updates:
+        update['$set'] = updates
+    if removals:
+        update['$unset'] = removals
+
+    if document.__class__.objects(__raw__=get_version_query(document, version)).update_one(__raw__=update) != 1:
+        return False
+    document.version = version + 1
+    document._clear_changed_fields()
+    return True
@@ -1,11 +1,17 @@
 from __future__ import unicode_literals
 
+from django.conf import settings
+from django.http import Http404
 from django.template.response import TemplateResponse
 
+from rest_framework.decorators import list_route
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 from rest_framework_mongoengine.viewsets import ModelViewSet as MongoModelViewSet
 
 from app.serializers import *
-from app.models import Tool, Book, Author
+from app.models import Tool, Book, Author, tool_cache
+from app.compact import CompactTool
 
 
 def index_view(request):
@@ -20,17 +26,74 @@ class ToolViewSet(MongoModelViewSet):
     """
     lookup_field = 'id'
     serializer_class = ToolSerializer
+    max_multi_get = 1000
 
     def get_queryset(self):
         return Tool.objects.all()
 
+    @property
+    def compact_reads(self):
+        """
+        If True, tools are read as read-only CompactTool views over raw
+        documents instead of Tool documents, see app.compact.
+        """
+        return getattr(settings, 'TOOL_COMPACT_READS', False) and self.request.method in SAFE_METHODS
+
+    def get_object(self):
+        # updates need the current version of the tool, reads may use the cache
+        if self.request.method not in SAFE_METHODS:
+            return super(ToolViewSet, self).get_object()
+
+        raw = tool_cache.get(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if raw is None:
+            raise Http404('No Tool matches the given query.')
+        obj = CompactTool(raw) if self.compact_reads else Tool._from_son(raw)
+
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def list(self, request, *args, **kwargs):
+        if not self.compact_reads:
+            return super(ToolViewSet, self).list(request, *args, **kwargs)
+
+        # raw documents are read page by page, if the view is paginated
+        queryset = self.filter_queryset(self.get_queryset()).as_pymongo()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            tools = [CompactTool(raw) for raw in page]
+            return self.get_paginated_response(self.get_serializer(tools, many=True).data)
+        return Response(self.get_serializer((CompactTool(raw) for raw in queryset), many=True).data)
+
+    @list_route(methods=['get'], url_path='multi')
+    def multi_get(self, request, *args, **kwargs):
+        """
+        Returns tools with the given ids: /api/tool/multi/?ids=id1,id2
+        Ids, that don't exist, are skipped.
+        """
+        ids = []
+        for pk in request.query_params.get('ids', '').split(','):
+            pk = pk.strip()
+            if pk and pk not in ids:
+                ids.append(pk)
+
+        ids = ids[:self.max_multi_get]
+        if self.compact_reads:
+            raws = tool_cache.get_many(ids)
+            tools = [CompactTool(raws[pk]) for pk in ids if pk in raws]
+        else:
+            tools = Tool.get_by_ids(ids)
+
+        serializer = self.get_serializer(tools, many=True)
+        return Response(serializer.data)
+
 
 class BookViewSet(MongoModelViewSet):
     lookup_field = 'id'
     serializer_class = BookSerializer
 
     def get_queryset(self):
-        return Book.objects.all()
+        # author name is denormalized into books, so there's no need to dereference authors
+        return Book.objects.no_dereference()
 
 
 class AuthorViewSet(MongoModelViewSet):
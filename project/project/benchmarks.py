@@ -0,0 +1,190 @@
+"""
+Micro-benchmarks, run with `python manage.py benchmark [name ...]`.
+
+Each benchmark is a function, that takes the parsed command options and
+returns a list of result rows - dicts, printed by the benchmark command.
+Benchmarks don't need a running MongoDB - they work on synthetic data.
+"""
+from __future__ import division
+
+import time
+import timeit
+from collections import OrderedDict
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Registers a benchmark function under the given name.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def sample_tool(i, ports=20):
+    """
+    Returns a Tool document, serialized the way ToolSerializer does it, with
+    the given number of inputs and outputs.
+    """
+    return OrderedDict([
+        ('id', 'tool-%d' % i),
+        ('class', 'CommandLineTool'),
+        ('label', 'Tool number %d' % i),
+        ('description', 'Synthetic tool, used in benchmarks'),
+        ('owner', ['owner@example.com']),
+        ('contributor', ['contributor@example.com']),
+        ('inputs', [OrderedDict([
+            ('id', '#input_%d' % j),
+            ('type', ['null', 'File']),
+            ('label', 'Input %d' % j),
+            ('description', 'Input file number %d' % j),
+            ('default', None),
+            ('inputBinding', {'position': j, 'prefix': '--input-%d' % j}),
+            ('required', True),
+        ]) for j in range(ports)]),
+        ('outputs', [OrderedDict([
+            ('id', '#output_%d' % j),
+            ('type', ['File']),
+            ('label', 'Output %d' % j),
+            ('default', None),
+            ('description', 'Output file number %d' % j),
+            ('outputBinding', {'glob': '*.out.%d' % j}),
+            ('required', True),
+        ]) for j in range(ports)]),
+        ('baseCommand', ['tool', '--verbose']),
+        ('arguments', []),
+        ('requirements', [{'class': 'DockerRequirement', 'dockerPull': 'ubuntu:16.04'}]),
+        ('hints', None),
+        ('cwlVersion', 'cwl:draft-2'),
+        ('stdin', None),
+        ('stdout', 'output.txt'),
+        ('successCodes', [0]),
+        ('temporaryFailCodes', []),
+        ('permanentFailCodes', [1, 2]),
+    ])
+
+
+def measure(func, number):
+    """
+    Returns the best average time of a single func() call in microseconds.
+    """
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+@benchmark('renderers')
+def bench_renderers(options):
+    """
+    Compares payload size and encode/decode time of JSON, MessagePack and
+    BSON on a page of Tool documents.
+    """
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.parsers import JSONParser
+    from django.utils.six import BytesIO
+
+    from project.renderers import MessagePackRenderer, BSONRenderer, get_msgpack
+    from project.parsers import MessagePackParser, BSONParser
+
+    data = {'results': [sample_tool(i) for i in range(options['size'] or 100)]}
+    formats = [('json', JSONRenderer(), JSONParser())]
+    if get_msgpack() is not None:
+        formats.append(('msgpack', MessagePackRenderer(), MessagePackParser()))
+    formats.append(('bson', BSONRenderer(), BSONParser()))
+
+    rows = []
+    for name, renderer, parser in formats:
+        payload = renderer.render(data)
+        rows.append(OrderedDict([
+            ('format', name),
+            ('bytes', len(payload)),
+            ('encode_us', measure(lambda: renderer.render(data), options['number'])),
+            ('decode_us', measure(lambda: parser.parse(BytesIO(payload)), options['number'])),
+        ]))
+    return rows
+
+
+@benchmark('throttle')
+def bench_throttle(options):
+    """
+    Measures the overhead of ScopedSlidingWindowThrottle per request.
+    """
+    from django.contrib.auth.models import AnonymousUser
+
+    from project.throttling import ScopedSlidingWindowThrottle
+    from users.models import ProjectedToken
+
+    class Request(object):
+        method = 'GET'
+        auth = None
+        user = AnonymousUser()
+        META = {'REMOTE_ADDR': '127.0.0.1'}
+
+    class View(object):
+        action = 'list'
+
+    request, view = Request(), View()
+    rows = []
+    for client in ('ip', 'token'):
+        if client == 'token':
+            request.auth = ProjectedToken('2c7e9e9465e917dcd34e620193ed2a7447140e5b', None)
+        # most of the iterations are beyond the rate and get denied, which costs as much as allowing
+        rows.append(OrderedDict([
+            ('client', client),
+            ('us_per_request', measure(lambda: ScopedSlidingWindowThrottle().allow_request(request, view),
+                                       options['number'] * 1000)),
+        ]))
+    return rows
+
+
+@benchmark('tool_memory')
+def bench_tool_memory(options):
+    """
+    Compares memory and time, needed to load a list of tools (10000 by default)
+    as Tool documents and as CompactTool views with hydrated inputs/outputs.
+    Memory is traced with tracemalloc, so it is skipped on Python < 3.4.
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        return [OrderedDict([('skipped', "tracemalloc requires Python 3.4 or newer")])]
+
+    from app.compact import CompactTool
+    from app.models import Tool
+
+    raws = []
+    for i in range(options['size'] or 10000):
+        raw = sample_tool(i)
+        raw['_id'] = raw.pop('id')
+        raws.append(dict(raw))
+
+    def load_documents():
+        return [Tool._from_son(raw) for raw in raws]
+
+    def load_compact():
+        tools = [CompactTool(raw) for raw in raws]
+        for tool in tools:
+            # hydrate embedded lists, as serialization does
+            tool.inputs
+            tool.outputs
+        return tools
+
+    rows = []
+    for name, load in (('Tool', load_documents), ('CompactTool', load_compact)):
+        tracemalloc.start()
+        start = time.time()
+        tools = load()
+        seconds = time.time() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append(OrderedDict([
+            ('representation', name),
+            ('tools', len(tools)),
+            ('mb', current / 2 ** 20),
+            ('peak_mb', peak / 2 ** 20),
+            ('bytes_per_tool', current // len(tools)),
+            ('load_ms', seconds * 1000),
+        ]))
+        del tools
+    return rows
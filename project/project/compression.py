@@ -0,0 +1,123 @@
+"""
+Response compression with gzip and, if the brotli package is installed, brotli.
+
+Settings:
+
+* COMPRESSION_MIN_SIZE - responses shorter than that (in bytes) are sent as is
+* COMPRESSION_GZIP_LEVEL - zlib compression level, 1-9
+* COMPRESSION_BROTLI_QUALITY - brotli quality, 0-11
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# supported encodings in the order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+accept_encoding_re = re.compile(r'^\s*([^\s;]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(request):
+    """
+    Returns supported encodings, accepted by the client according to its
+    Accept-Encoding header, best first.
+    """
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    weights = {}
+    for part in header.split(','):
+        match = accept_encoding_re.match(part)
+        if not match:
+            continue
+        coding, q = match.group(1).lower(), match.group(2)
+        try:
+            weights[coding] = float(q) if q is not None else 1.0
+        except ValueError:
+            continue
+
+    wildcard = weights.get('*', 0.0)
+    accepted = [(weights.get(coding, wildcard), coding) for coding in ENCODINGS]
+    # sort by weight, keeping the server preference order for equal weights
+    accepted = sorted((item for item in accepted if item[0] > 0), key=lambda item: -item[0])
+    return [coding for weight, coding in accepted]
+
+
+def get_compressor(encoding):
+    """
+    Returns a (compress(chunk), flush(), finish()) triple of a new streaming
+    compressor for the given encoding.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+        return compressor.process, compressor.flush, compressor.finish
+
+    # wbits=16+MAX_WBITS makes zlib write gzip header and trailer
+    compressor = zlib.compressobj(getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_string(data, encoding):
+    compress, flush, finish = get_compressor(encoding)
+    return compress(data) + finish()
+
+
+def compress_sequence(sequence, encoding):
+    """
+    Compresses an iterable of byte strings. Every chunk is flushed, so that
+    the client receives data as soon as it is produced.
+    """
+    compress, flush, finish = get_compressor(encoding)
+    for chunk in sequence:
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware(object):
+    """
+    Compresses responses with the best encoding, supported by the client.
+
+    Like django.middleware.gzip.GZipMiddleware, it should be placed before
+    any middleware, that needs to read or write the response body.
+    """
+    def process_response(self, request, response):
+        # already compressed (e.g. precompressed static files) or too small to bother
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encodings = accepted_encodings(request)
+        if not encodings:
+            return response
+        encoding = encodings[0]
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content, encoding)
+            # the length of compressed content is not known in advance
+            del response['Content-Length']
+        else:
+            compressed_content = compress_string(response.content, encoding)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+
+        # compressed representation is not byte-for-byte equal to the original one
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+
+        return response
@@ -0,0 +1,447 @@
+"""
+In-process metrics, exposed at /api/metrics/ in Prometheus text format by
+project.metrics_api. This module doesn't depend on DRF, so that models can
+record metrics.
+
+Metrics are counters and histograms with labels. Every combination of label
+values has its own child with its own lock, so threads, that record different
+label values, don't contend. The following metrics are recorded:
+
+* api_requests_total, api_request_duration_seconds - by view (class name of a
+  view or viewset), HTTP method and status, see project.metrics_api
+* api_serializer_duration_seconds - by serializer, see project.metrics_api
+* mongo_commands_total, mongo_command_duration_seconds - by collection and
+  command, recorded by command monitoring of pymongo 3.1+ or by wrapped
+  Collection and Cursor methods of older versions, once install() is called
+* document_cache_requests_total - documents, found in the local LRU, in the
+  shared cache or missed by app.cache.DocumentCache
+* auth_requests_total - successful and failed authentications by method
+* auth_full_user_loads_total - ProjectedUsers, that had to load the full User
+
+By default a scrape returns metrics of the process, that serves it. For
+multi-process deployments set METRICS_DIR to a directory, shared by workers:
+each process writes its metrics to its own file there at most every
+METRICS_FLUSH_INTERVAL seconds and on exit, and a scrape sums the files of all
+processes. Files of processes, that exited, are kept, so that counters don't
+go down; clear the directory, when the server starts.
+"""
+from __future__ import division
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import timeit
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import six
+
+from pymongo.collection import Collection
+from pymongo.cursor import Cursor
+
+try:
+    from pymongo import monitoring
+except ImportError:  # pymongo < 3.1 has no command monitoring, its methods are instrumented instead
+    monitoring = None
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+
+
+class CounterValue(object):
+    __slots__ = ('lock', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        with self.lock:
+            return [self.value]
+
+
+class HistogramValue(object):
+    """
+    Counts of observations in each bucket (the last one is +Inf) and their sum.
+    """
+    __slots__ = ('lock', 'buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self.observe(timeit.default_timer() - start)
+
+    def get(self):
+        with self.lock:
+            return self.counts + [self.sum]
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues):
+        """
+        Returns the child of the metric with the given label values. Callers
+        on hot paths may keep the child instead of looking it up every time.
+        """
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError("%s expects labels %s, got %r" % (self.name, self.labelnames, labelvalues))
+        labelvalues = tuple(six.text_type(value) for value in labelvalues)
+        child = self.children.get(labelvalues)
+        if child is None:
+            with self.lock:
+                child = self.children.get(labelvalues)
+                if child is None:
+                    child = self.children[labelvalues] = self.new_value()
+        return child
+
+    def collect(self):
+        """
+        Returns {label values: list of values} of all children.
+        """
+        with self.lock:
+            children = list(self.children.items())
+        return dict((labelvalues, child.get()) for labelvalues, child in children)
+
+    def samples(self, values):
+        """
+        Yields (name, label pairs, value) of the text format for {label values: list of values}.
+        """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def new_value(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self, values):
+        for labelvalues, (value,) in sorted(values.items()):
+            yield self.name, list(zip(self.labelnames, labelvalues)), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super(Histogram, self).__init__(name, documentation, labelnames, registry)
+
+    def new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self, values):
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        for labelvalues, value in sorted(values.items()):
+            labels = list(zip(self.labelnames, labelvalues))
+            counts, total = value[:-1], value[-1]
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield self.name + '_bucket', labels + [('le', bound)], cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()
+        self.pid = None
+        self.path = None
+        self.flushed = 0
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError("Metric %s is already registered" % metric.name)
+            self.metrics[metric.name] = metric
+
+    def collect(self):
+        """
+        Returns {metric name: {label values: list of values}} of this process.
+        """
+        return dict((name, metric.collect()) for name, metric in self.metrics.items())
+
+    def get_path(self, directory):
+        # forked processes must not write to the file of their parent
+        pid = os.getpid()
+        if self.pid != pid:
+            if self.pid is None:
+                atexit.register(self.flush)
+            self.pid = pid
+            self.path = os.path.join(directory, '%d-%s.json' % (pid, uuid.uuid4().hex))
+        return self.path
+
+    def flush(self, directory=None):
+        """
+        Writes metrics of this process to its file in the directory, METRICS_DIR by default.
+        """
+        directory = directory or get_directory()
+        if directory is None:
+            return
+        path = self.get_path(directory)
+        data = dict(
+            (name, [[list(labelvalues), value] for labelvalues, value in values.items()])
+            for name, values in self.collect().items()
+        )
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        getattr(os, 'replace', os.rename)(temp_path, path)
+        self.flushed = timeit.default_timer()
+
+    def flush_if_due(self):
+        directory = get_directory()
+        if directory is None:
+            return
+        if timeit.default_timer() - self.flushed < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        # one thread flushes, the others don't wait for it
+        if self.lock.acquire(False):
+            try:
+                self.flush(directory)
+            finally:
+                self.lock.release()
+
+    def collect_directory(self, directory):
+        """
+        Returns metrics of all processes, that wrote them to the directory, summed by label values.
+        """
+        merged = dict((name, {}) for name in self.metrics)
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    data = json.load(f)
+            except (IOError, OSError, ValueError):
+                # the file was removed or is being replaced
+                continue
+            for name, values in data.items():
+                if name not in merged:
+                    continue
+                for labelvalues, value in values:
+                    labelvalues = tuple(labelvalues)
+                    total = merged[name].get(labelvalues)
+                    merged[name][labelvalues] = value if total is None else [a + b for a, b in zip(total, value)]
+        return merged
+
+    def render(self):
+        """
+        Returns metrics in Prometheus text format. With METRICS_DIR, metrics
+        of all processes are rendered.
+        """
+        directory = get_directory()
+        if directory is None:
+            values = self.collect()
+        else:
+            with self.lock:
+                self.flush(directory)
+            values = self.collect_directory(directory)
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append('# HELP %s %s' % (name, metric.documentation.replace('\\', r'\\').replace('\n', r'\n')))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for sample_name, labels, value in metric.samples(values.get(name, {})):
+                lines.append('%s%s %s' % (sample_name, format_labels(labels), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def get_directory():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels
+    )
+
+
+def format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return '%d' % value
+
+
+REGISTRY = Registry()
+
+api_requests = Counter(
+    'api_requests_total', "Requests by view, HTTP method and status.", ('view', 'method', 'status'))
+api_request_duration = Histogram(
+    'api_request_duration_seconds', "Request latency by view and HTTP method.", ('view', 'method'))
+api_serializer_duration = Histogram(
+    'api_serializer_duration_seconds', "Time of serializing response data by serializer.", ('serializer',),
+    buckets=FAST_BUCKETS)
+mongo_commands = Counter(
+    'mongo_commands_total', "Mongo commands by collection, command and status.", ('collection', 'command', 'status'))
+mongo_command_duration = Histogram(
+    'mongo_command_duration_seconds', "Mongo command latency by collection and command.", ('collection', 'command'),
+    buckets=FAST_BUCKETS)
+document_cache_requests = Counter(
+    'document_cache_requests_total', "Documents, requested from a document cache, by result: local, shared or miss.",
+    ('cache', 'result'))
+auth_requests = Counter(
+    'auth_requests_total', "Authentications by method and result.", ('method', 'result'))
+auth_full_user_loads = Counter(
+    'auth_full_user_loads_total', "Authenticated users, whose full User document had to be loaded.")
+
+
+@contextmanager
+def mongo_command(collection, command):
+    """
+    Records mongo_commands_total and mongo_command_duration_seconds of a
+    command, sent in the block.
+    """
+    start = timeit.default_timer()
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        mongo_commands.labels(collection, command, status).inc()
+        mongo_command_duration.labels(collection, command).observe(timeit.default_timer() - start)
+
+
+def instrument_method(cls, name, command, get_collection):
+    method = getattr(cls, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with mongo_command(get_collection(self), command):
+            return method(self, *args, **kwargs)
+
+    setattr(cls, name, wrapper)
+
+
+def instrument_collection(cls):
+    """
+    Records commands, sent by methods of a pymongo 2.x Collection class.
+    Methods, that only call other ones (save, find_one, count, distinct),
+    are recorded by those.
+    """
+    commands = (
+        ('insert', 'insert'), ('update', 'update'), ('remove', 'delete'), ('find_and_modify', 'findAndModify'),
+        ('aggregate', 'aggregate'), ('map_reduce', 'mapReduce'), ('inline_map_reduce', 'mapReduce'),
+        ('group', 'group'),
+    )
+    for name, command in commands:
+        instrument_method(cls, name, command, lambda collection: collection.name)
+
+
+def instrument_cursor(cls):
+    """
+    Records queries and getMores, sent by a pymongo 2.x Cursor class, when it
+    runs out of fetched documents, and its count and distinct commands.
+    """
+    refresh = cls._refresh
+
+    @functools.wraps(refresh)
+    def _refresh(self):
+        # a killed cursor or one with id 0 (the last batch is fetched) doesn't contact the server
+        if not self.alive or self.cursor_id == 0:
+            return refresh(self)
+        with mongo_command(self.collection.name, 'find' if self.cursor_id is None else 'getMore'):
+            return refresh(self)
+
+    cls._refresh = _refresh
+    for name in ('count', 'distinct'):
+        instrument_method(cls, name, name, lambda cursor: cursor.collection.name)
+
+
+class MongoCommandListener(monitoring.CommandListener if monitoring is not None else object):
+    """
+    Records mongo_commands_total and mongo_command_duration_seconds.
+    """
+    def __init__(self):
+        # (connection id, request id): collection of started commands
+        self.collections = {}
+
+    def started(self, event):
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        else:
+            collection = event.command.get(event.command_name)
+        if not isinstance(collection, six.string_types):
+            collection = ''
+        self.collections[(event.connection_id, event.request_id)] = collection
+
+    def finished(self, event, status):
+        collection = self.collections.pop((event.connection_id, event.request_id), '')
+        mongo_commands.labels(collection, event.command_name, status).inc()
+        mongo_command_duration.labels(collection, event.command_name).observe(event.duration_micros / 1000000)
+
+    def succeeded(self, event):
+        self.finished(event, 'ok')
+
+    def failed(self, event):
+        self.finished(event, 'error')
+
+
+_installed = False
+
+
+def install():
+    """
+    Starts recording Mongo commands of the process: registers a command
+    listener with pymongo 3.1+ or wraps methods of pymongo Collection and
+    Cursor classes otherwise. Called once from settings.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    if monitoring is not None:
+        # listeners are taken by clients, created afterwards; mongoengine connects on the first query
+        monitoring.register(MongoCommandListener())
+    else:
+        instrument_collection(Collection)
+        instrument_cursor(Cursor)
@@ -0,0 +1,100 @@
+"""
+Request and serializer instrumentation and the endpoint of project.metrics.
+Only urls, serializers and settings import this module, because it depends on DRF.
+
+The endpoint is readable from METRICS_ALLOWED_IPS and by staff users with a token.
+"""
+import timeit
+
+from django.conf import settings
+
+from rest_framework import permissions, serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from project.metrics import REGISTRY, api_requests, api_request_duration, api_serializer_duration
+from project.renderers import PrometheusTextRenderer
+from users.authentication import TokenAuthentication
+
+
+# other methods are recorded as 'other', so that clients can't add label values
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+class MetricsMiddleware(object):
+    """
+    Records api_requests_total and api_request_duration_seconds. Must be the
+    first middleware, so that the latency includes all the others.
+    """
+    def process_request(self, request):
+        request._metrics_start = timeit.default_timer()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # views and viewsets of DRF keep their class on the view function
+        view_cls = getattr(view_func, 'cls', None)
+        if view_cls is not None:
+            request._metrics_view = view_cls.__name__
+        else:
+            request._metrics_view = getattr(view_func, '__name__', 'unknown')
+
+    def process_response(self, request, response):
+        start = getattr(request, '_metrics_start', None)
+        if start is not None:
+            view = getattr(request, '_metrics_view', 'unmatched')
+            method = request.method if request.method in HTTP_METHODS else 'other'
+            api_requests.labels(view, method, response.status_code).inc()
+            api_request_duration.labels(view, method).observe(timeit.default_timer() - start)
+            REGISTRY.flush_if_due()
+        return response
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with api_serializer_duration.labels(type(self.child).__name__).time():
+            return super(TimedListSerializer, self).data
+
+
+class TimedSerializerMixin(object):
+    """
+    Records api_serializer_duration_seconds, when data of the serializer or
+    of its list serializer (many=True) is accessed.
+    """
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        allow_empty = kwargs.pop('allow_empty', None)
+        list_kwargs = dict(
+            (key, value) for key, value in kwargs.items() if key in serializers.LIST_SERIALIZER_KWARGS
+        )
+        list_kwargs['child'] = cls(*args, **kwargs)
+        if allow_empty is not None:
+            list_kwargs['allow_empty'] = allow_empty
+        return TimedListSerializer(*args, **list_kwargs)
+
+    @property
+    def data(self):
+        with api_serializer_duration.labels(type(self).__name__).time():
+            return super(TimedSerializerMixin, self).data
+
+
+class IsMetricsReader(permissions.BasePermission):
+    """
+    Allows requests from METRICS_ALLOWED_IPS and from staff users.
+    """
+    def has_permission(self, request, view):
+        if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    Metrics in Prometheus text format.
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsMetricsReader,)
+    throttle_classes = ()
+    renderer_classes = (PrometheusTextRenderer,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(REGISTRY.render())
@@ -0,0 +1,43 @@
+"""
+Parsers for the compact binary formats, produced by project.renderers.
+"""
+import bson
+from bson.errors import BSONError
+
+from django.utils import six
+
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from project.renderers import MessagePackRenderer, BSONRenderer, get_msgpack
+
+
+class MessagePackParser(parsers.BaseParser):
+    """
+    Parses MessagePack-serialized data.
+    """
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        msgpack = get_msgpack()
+        assert msgpack is not None, 'MessagePackParser requires the msgpack package to be installed'
+
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError('MessagePack parse error - %s' % six.text_type(exc))
+
+
+class BSONParser(parsers.BaseParser):
+    """
+    Parses a single BSON document.
+    """
+    media_type = 'application/bson'
+    renderer_class = BSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return bson.BSON(stream.read()).decode()
+        except (BSONError, ValueError) as exc:
+            raise ParseError('BSON parse error - %s' % six.text_type(exc))
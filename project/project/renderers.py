@@ -0,0 +1,122 @@
+"""
+Compact binary renderers for service-to-service traffic.
+
+Both renderers are selected by DRF content negotiation, either through
+the ``Accept`` header or the ``?format=`` query parameter.
+
+PrometheusTextRenderer is used by the metrics endpoint only.
+"""
+import datetime
+
+import bson
+from bson.errors import InvalidDocument
+from bson.objectid import ObjectId
+
+from django.utils import six
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+def get_msgpack():
+    """
+    Returns the msgpack module or None, if it isn't installed. It is imported
+    on first use, because it is one of the slowest imports at startup and
+    most clients never ask for MessagePack.
+    """
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+class BinaryEncoder(encoders.JSONEncoder):
+    """
+    Reuses DRF's JSON type coercions (datetimes, decimals, lazy strings etc.)
+    for binary formats, which don't know how to encode these types either.
+    """
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return super(BinaryEncoder, self).default(obj)
+
+
+BSON_NATIVE_TYPES = six.string_types + six.integer_types + (
+    six.binary_type, bool, float, datetime.datetime, ObjectId
+)
+
+
+def to_primitive(obj, default=BinaryEncoder().default):
+    """
+    Recursively replaces values, that are not natively supported by BSON, with
+    their primitive representation.
+    """
+    if isinstance(obj, dict):
+        return dict((key, to_primitive(value, default)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [to_primitive(item, default) for item in obj]
+    if obj is None or isinstance(obj, BSON_NATIVE_TYPES):
+        return obj
+    try:
+        return to_primitive(default(obj), default)
+    except TypeError:
+        return obj
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renderer which serializes to MessagePack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        msgpack = get_msgpack()
+        assert msgpack is not None, 'MessagePackRenderer requires the msgpack package to be installed'
+        return msgpack.packb(data, default=BinaryEncoder().default, use_bin_type=True)
+
+
+class BSONRenderer(renderers.BaseRenderer):
+    """
+    Renderer which serializes to BSON.
+
+    BSON top-level value must be a document, so unpaginated lists are
+    wrapped into a ``{"results": [...]}`` document, just like paginated ones.
+    """
+    media_type = 'application/bson'
+    format = 'bson'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if not isinstance(data, dict):
+            data = {'results': data}
+
+        try:
+            return bson.BSON.encode(data)
+        except InvalidDocument:
+            # slow path: coerce decimals, datetimes, lazy strings etc. to primitives
+            return bson.BSON.encode(to_primitive(data))
+
+
+class PrometheusTextRenderer(renderers.BaseRenderer):
+    """
+    Renderer of metrics, already formatted in Prometheus text format by
+    project.metrics. Error responses (e.g. 405) are rendered as their detail.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = six.text_type(data.get('detail', data))
+        return data.encode(self.charset)
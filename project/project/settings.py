@@ -48,7 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'project.metrics_api.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'project.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -117,12 +119,7 @@ def is_test():
 
     We might need a better implementation of this function.
     """
-    if 'test' in sys.argv or 'testserver' in sys.argv:
-        print("Using a test mongo database")
-        return True
-    else:
-        print("Using a default mongo database")
-        return False
+    return 'test' in sys.argv or 'testserver' in sys.argv
 
 if is_test():
     db = 'test'
@@ -130,10 +127,12 @@ else:
     db = 'default'
 
 
-# establish connection with default or test database, depending on the management command, being run
+# register connection with default or test database, depending on the management command, being run;
+# it is opened lazily by the first query, so that commands, which don't touch mongo, don't wait for it
 # note that this connection syntax is correct for mongoengine0.9-, but mongoengine0.10+ introduced slight changes
-mongoengine.connect(
-    db=MONGODB_DATABASES[db]['name'],
+mongoengine.register_connection(
+    mongoengine.DEFAULT_CONNECTION_NAME,
+    name=MONGODB_DATABASES[db]['name'],
     host=MONGODB_DATABASES[db]['host']
 )
 
@@ -172,6 +171,59 @@ DEFAULT_AUTHENTICATION_CLASSES = (
     'rest_framework.authentication.SessionAuthentication',
 )
 
+REST_FRAMEWORK = {
+    # JSON stays the default, compact binary formats are selected by Accept header or ?format=
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'project.renderers.MessagePackRenderer',
+        'project.renderers.BSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'project.parsers.MessagePackParser',
+        'project.parsers.BSONParser',
+    ),
+    # proxies in front of the server, that append to X-Forwarded-For; 0 identifies
+    # clients by REMOTE_ADDR, so that they can't evade throttling with the header
+    'NUM_PROXIES': 0,
+    # see project.throttling for scopes and client identification
+    'DEFAULT_THROTTLE_CLASSES': (
+        'project.throttling.ScopedSlidingWindowThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '20/min',
+        'list': '120/min',
+        'write': '60/min',
+    },
+}
+
+# Alias of a cache from CACHES to share throttling counters between processes,
+# None keeps them in process-local memory
+THROTTLE_CACHE = None
+
+# Read-through cache of Tool documents by id, see app.cache.DocumentCache
+TOOL_CACHE_SIZE = 1000  # documents in the in-process LRU, 0 disables the cache
+TOOL_CACHE_TTL = 60  # seconds
+TOOL_CACHE_SHARED = None  # alias of a cache from CACHES, shared by processes
+
+# Serialize tools in list/retrieve responses from read-only compact views over
+# raw documents instead of full Tool documents, see app.compact
+TOOL_COMPACT_READS = False
+
+# Metrics at /api/metrics/, see project.metrics. For multi-process servers set
+# METRICS_DIR to a directory, shared by workers, None keeps metrics per process
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5  # seconds
+# addresses of scrapers, other clients need a token of a staff user
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# record Mongo commands; on pymongo < 3.1 this wraps methods of its Collection and Cursor
+from project import metrics
+metrics.install()
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 
@@ -197,6 +249,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 STATICFILES_DIRS = (
     os.path.join(BASE_DIR, "project", "static"),
 )
+# collectstatic writes .gz/.br siblings of text assets, see project.staticfiles
+STATICFILES_STORAGE = 'project.staticfiles.CompressedStaticFilesStorage'
+
+# Response compression, see project.compression
+COMPRESSION_MIN_SIZE = 1024  # bytes
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
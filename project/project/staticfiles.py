@@ -0,0 +1,74 @@
+"""
+Precompressed static files: collectstatic writes .gz/.br siblings of text
+assets, and the development server sends them to clients, that accept them.
+"""
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views import static
+
+from project.compression import ENCODINGS, SUFFIXES, accepted_encodings, compress_string
+
+
+class CompressedStaticFilesStorage(StaticFilesStorage):
+    """
+    Static files storage, that saves compressed copies of collected files
+    next to the originals, e.g. app.js.gz and app.js.br next to app.js.
+    Copies, left by a previous collectstatic, are removed, even if a file is
+    not compressed this time, because serve() would prefer them.
+    """
+    compressed_extensions = ('.html', '.css', '.js', '.json', '.map', '.svg', '.txt', '.xml')
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        for name in paths:
+            if not name.endswith(self.compressed_extensions):
+                continue
+
+            for suffix in SUFFIXES.values():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+
+            with self.open(name) as original:
+                content = original.read()
+            if len(content) < min_size:
+                continue
+
+            for encoding in ENCODINGS:
+                compressed_content = compress_string(content, encoding)
+                if len(compressed_content) < len(content):
+                    self.save(name + SUFFIXES[encoding], ContentFile(compressed_content))
+
+            yield name, name, True
+
+
+def serve(request, path, document_root=None, show_indexes=False):
+    """
+    Drop-in replacement for django.views.static.serve, that serves a
+    precompressed sibling of the requested file, if there is one.
+    """
+    for encoding in accepted_encodings(request):
+        compressed_path = path + SUFFIXES[encoding]
+        if not os.path.isfile(safe_join(document_root, compressed_path)):
+            continue
+
+        response = static.serve(request, compressed_path, document_root=document_root)
+        content_type, _ = mimetypes.guess_type(path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    response = static.serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    # clients, that accept other encodings, may get a compressed sibling, so caches must tell them apart
+    if any(os.path.isfile(safe_join(document_root, path + suffix)) for suffix in SUFFIXES.values()):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
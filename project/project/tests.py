@@ -0,0 +1,296 @@
+import datetime
+import decimal
+import gzip
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+
+from project.benchmarks import BENCHMARKS, sample_tool
+from project.compression import CompressionMiddleware
+from project.metrics import (
+    Registry, Counter, Histogram, api_requests, mongo_commands, instrument_collection, instrument_cursor
+)
+from project.parsers import MessagePackParser, BSONParser
+from project.renderers import MessagePackRenderer, BSONRenderer
+from project.staticfiles import CompressedStaticFilesStorage, serve
+from project.throttling import LocalSlidingWindowCounter
+
+
+class BinaryRenderersTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tool = sample_tool(1, ports=3)
+
+    def test_msgpack_round_trip(self):
+        payload = MessagePackRenderer().render(self.tool)
+        self.assertEqual(MessagePackParser().parse(BytesIO(payload)), self.tool)
+
+    def test_bson_round_trip(self):
+        payload = BSONRenderer().render(self.tool)
+        self.assertEqual(BSONParser().parse(BytesIO(payload)), self.tool)
+
+    def test_bson_wraps_lists(self):
+        payload = BSONRenderer().render([self.tool])
+        self.assertEqual(BSONParser().parse(BytesIO(payload)), {'results': [self.tool]})
+
+    def test_bson_coerces_unsupported_types(self):
+        now = datetime.datetime(2016, 1, 1, 12, 0)
+        payload = BSONRenderer().render({'price': decimal.Decimal('1.50'), 'created': now})
+        self.assertEqual(BSONParser().parse(BytesIO(payload)), {'price': 1.5, 'created': now})
+
+
+class BenchmarksTestCase(SimpleTestCase):
+    def test_tool_memory(self):
+        # memory is traced on Python 3.4+ only, older interpreters skip the benchmark instead of failing
+        rows = BENCHMARKS['tool_memory']({'size': 2, 'number': 1})
+
+        self.assertTrue(rows)
+        self.assertTrue(all('skipped' in row or row['tools'] == 2 for row in rows))
+
+
+class CompressionMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.middleware = CompressionMiddleware()
+        self.content = b'{"id": "tool", "label": "Tool"}' * 100
+
+    def get_request(self, accept_encoding='gzip'):
+        return RequestFactory().get('/api/tool/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def decompress(self, content):
+        return gzip.GzipFile(fileobj=BytesIO(content)).read()
+
+    def test_compress_response(self):
+        response = self.middleware.process_response(self.get_request(), HttpResponse(self.content))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(self.decompress(response.content), self.content)
+
+    def test_compress_streaming_response(self):
+        response = StreamingHttpResponse(iter([self.content, self.content]))
+        response = self.middleware.process_response(self.get_request(), response)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(self.decompress(b''.join(response.streaming_content)), self.content * 2)
+
+    def test_skip_small_response(self):
+        response = self.middleware.process_response(self.get_request(), HttpResponse(b'{}'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_skip_unsupported_encoding(self):
+        response = self.middleware.process_response(self.get_request('identity'), HttpResponse(self.content))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.content)
+
+
+class CompressedStaticFilesTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = CompressedStaticFilesStorage(location=self.directory, base_url='/static/')
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(content)
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.directory, name))
+
+    def post_process(self, *names):
+        return list(self.storage.post_process(dict((name, (self.storage, name)) for name in names)))
+
+    def test_compress_text_assets(self):
+        self.write('app.js', b'var tool = {"id": "tool"};\n' * 100)
+        self.write('logo.png', b'\x89PNG' * 1000)
+        self.post_process('app.js', 'logo.png')
+
+        with gzip.open(os.path.join(self.directory, 'app.js.gz')) as f:
+            self.assertEqual(f.read(), b'var tool = {"id": "tool"};\n' * 100)
+        self.assertFalse(self.exists('logo.png.gz'))
+
+    def test_remove_stale_copies(self):
+        # copies of the previous, bigger versions of the files
+        self.write('small.js.gz', b'stale')
+        self.write('random.js.gz', b'stale')
+        self.write('random.js.br', b'stale')
+        self.write('small.js', b'var a;')
+        self.write('random.js', os.urandom(4096))
+        self.post_process('small.js', 'random.js')
+
+        for name in ('small.js.gz', 'random.js.gz', 'random.js.br'):
+            self.assertFalse(self.exists(name), name)
+
+    def test_serve_precompressed(self):
+        self.write('app.css', b'a {}')
+        self.write('app.css.gz', b'compressed')
+        request = RequestFactory().get('/static/app.css', HTTP_ACCEPT_ENCODING='gzip')
+        response = serve(request, 'app.css', document_root=self.directory)
+        self.addCleanup(response.close)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(response.streaming_content), b'compressed')
+
+    def test_serve_original(self):
+        self.write('app.css', b'a {}')
+        self.write('app.css.gz', b'compressed')
+        request = RequestFactory().get('/static/app.css', HTTP_ACCEPT_ENCODING='identity')
+        response = serve(request, 'app.css', document_root=self.directory)
+        self.addCleanup(response.close)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(response.streaming_content), b'a {}')
+
+
+class LocalSlidingWindowCounterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.counter = LocalSlidingWindowCounter()
+
+    def test_deny_over_limit(self):
+        results = [self.counter.hit('client', 3, 60, 120.0 + i) for i in range(4)]
+
+        self.assertEqual([allowed for allowed, wait in results], [True, True, True, False])
+        self.assertEqual(results[-1][1], 57.0)
+
+    def test_previous_window_is_weighted(self):
+        for i in range(4):
+            self.counter.hit('client', 4, 60, 120.0 + i)
+
+        # 3/4 of the previous window overlap with the sliding one: 4 * 0.75 = 3 requests
+        self.assertEqual(self.counter.hit('client', 4, 60, 195.0), (True, None))
+        self.assertFalse(self.counter.hit('client', 4, 60, 195.0)[0])
+
+    def test_clients_are_counted_separately(self):
+        self.counter.hit('client', 1, 60, 120.0)
+
+        self.assertFalse(self.counter.hit('client', 1, 60, 121.0)[0])
+        self.assertTrue(self.counter.hit('other', 1, 60, 121.0)[0])
+
+    def test_purge_keeps_busiest_keys(self):
+        self.counter.max_keys = 4
+        for i in range(3):
+            self.counter.hit('busy', 10, 60, 120.0)
+        for key in ('a', 'b', 'c', 'd'):
+            self.counter.hit(key, 10, 60, 121.0)
+
+        self.assertEqual(len(self.counter.windows), 4)
+        self.assertIn('busy', self.counter.windows)
+        self.assertIn('d', self.counter.windows)
+
+
+class MetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.requests = Counter('requests_total', "Requests.", ('view',), registry=self.registry)
+        self.latency = Histogram('latency_seconds', "Latency.", buckets=(.1, 1), registry=self.registry)
+
+    def test_render(self):
+        self.requests.labels('ToolViewSet').inc()
+        self.requests.labels('ToolViewSet').inc(2)
+        self.latency.observe(.05)
+        self.latency.observe(.5)
+        self.latency.observe(5)
+
+        self.assertEqual(self.registry.render().splitlines(), [
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{view="ToolViewSet"} 3',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1.0"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.55',
+            'latency_seconds_count 3',
+        ])
+
+    def test_wrong_labels(self):
+        with self.assertRaises(ValueError):
+            self.requests.labels()
+
+    def test_shared_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        # another process, that flushed its metrics to the directory
+        other = Registry()
+        Counter('requests_total', "Requests.", ('view',), registry=other).labels('ToolViewSet').inc(2)
+        other.flush(directory)
+
+        self.requests.labels('ToolViewSet').inc()
+        self.requests.labels('BookViewSet').inc()
+        with override_settings(METRICS_DIR=directory):
+            lines = self.registry.render().splitlines()
+
+        self.assertIn('requests_total{view="ToolViewSet"} 3', lines)
+        self.assertIn('requests_total{view="BookViewSet"} 1', lines)
+
+    def test_endpoint(self):
+        self.client.get('/api/metrics/')
+        response = self.client.get('/api/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'api_requests_total{view="MetricsView",method="GET",status="200"}', response.content)
+
+    def test_endpoint_is_restricted(self):
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 401)
+
+        with override_settings(METRICS_ALLOWED_IPS=('10.0.0.1',)):
+            response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_method(self):
+        self.client.generic('PROPFIND', '/api/metrics/')
+
+        self.assertIn(('MetricsView', 'other', '405'), api_requests.collect())
+        self.assertNotIn(('MetricsView', 'PROPFIND', '405'), api_requests.collect())
+
+    def test_mongo_methods(self):
+        class Collection(object):
+            name = 'instrumented'
+
+            def insert(self, docs):
+                return [doc['_id'] for doc in docs]
+
+            def remove(self, spec):
+                raise ValueError(spec)
+
+        class Cursor(object):
+            collection = Collection()
+            alive = True
+            cursor_id = None
+
+            def _refresh(self):
+                self.cursor_id = 0
+                return 1
+
+            def count(self):
+                return 1
+
+        for name in ('update', 'find_and_modify', 'aggregate', 'map_reduce', 'inline_map_reduce', 'group'):
+            setattr(Collection, name, lambda self: None)
+        setattr(Cursor, 'distinct', lambda self, key: [])
+        instrument_collection(Collection)
+        instrument_cursor(Cursor)
+
+        self.assertEqual(Collection().insert([{'_id': 1}]), [1])
+        with self.assertRaises(ValueError):
+            Collection().remove({})
+        cursor = Cursor()
+        cursor._refresh()
+        cursor._refresh()  # the cursor is exhausted, no getMore is sent
+        cursor.count()
+
+        values = mongo_commands.collect()
+        self.assertEqual(values[('instrumented', 'insert', 'ok')], [1])
+        self.assertEqual(values[('instrumented', 'delete', 'error')], [1])
+        self.assertEqual(values[('instrumented', 'find', 'ok')], [1])
+        self.assertEqual(values[('instrumented', 'count', 'ok')], [1])
+        self.assertNotIn(('instrumented', 'getMore', 'ok'), values)
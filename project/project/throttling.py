@@ -0,0 +1,215 @@
+"""
+Request throttling with a sliding window counter.
+
+Each client is identified by its token, its user id or its IP address (in
+that order) and is throttled separately in each of the following scopes:
+
+* auth - views with `throttle_scope = 'auth'`, e.g. ObtainAuthToken; the
+  posted username is throttled with the same rate as well, so that a password
+  can't be guessed from many addresses
+* list - `list` actions of viewsets
+* write - unsafe HTTP methods
+
+Rates are taken from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], e.g. {'list': '120/min'}.
+A scope without a rate is not throttled.
+
+IP addresses are taken from X-Forwarded-For only behind as many proxies as
+REST_FRAMEWORK['NUM_PROXIES'] says, otherwise clients could pick their own.
+
+Counters are kept in process-local memory by default. For multi-process
+deployments set THROTTLE_CACHE to an alias from CACHES, shared by workers.
+"""
+from __future__ import division
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import six
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_rates = {}
+
+
+def parse_rate(rate):
+    """
+    Converts a rate string like '100/min' into (number of requests, duration in seconds).
+    """
+    if rate not in _rates:
+        num, period = rate.split('/')
+        _rates[rate] = (int(num), DURATIONS[period[0]])
+    return _rates[rate]
+
+
+def estimate(previous, current, elapsed, duration):
+    """
+    Sliding window estimate of the number of requests, made during the last
+    `duration` seconds: requests from the previous fixed window are weighted by
+    the share of it, that still overlaps with the sliding window.
+    """
+    return previous * (1 - elapsed / duration) + current
+
+
+def get_wait(previous, current, elapsed, limit, duration):
+    """
+    Returns the number of seconds, after which the estimate drops below the limit.
+    """
+    if previous and current < limit:
+        return max(duration * (1 - (limit - current) / previous) - elapsed, 0)
+    return duration - elapsed
+
+
+class LocalSlidingWindowCounter(object):
+    """
+    Process-local counters, stored as
+    {key: [window number, previous count, current count, expiration time]}.
+    """
+    max_keys = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def hit(self, key, limit, duration, now):
+        """
+        Counts a request, if it fits into the limit. Returns (allowed, wait).
+        """
+        number, elapsed = divmod(now, duration)
+
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None:
+                if len(self.windows) >= self.max_keys:
+                    self.purge(now)
+                window = self.windows[key] = [number, 0, 0, (number + 2) * duration]
+            elif window[0] != number:
+                # roll the window over; after a silence longer than a window nothing is left to carry
+                window[1] = window[2] if window[0] == number - 1 else 0
+                window[2] = 0
+                window[0] = number
+                window[3] = (number + 2) * duration
+
+            if estimate(window[1], window[2], elapsed, duration) >= limit:
+                return False, get_wait(window[1], window[2], elapsed, limit, duration)
+
+            window[2] += 1
+            return True, None
+
+    def purge(self, now):
+        """
+        Drops the counters, that can no longer affect any estimate. If most of
+        them still can, only the busiest 3/4 of max_keys are kept, so that
+        clients, making up new keys, can't grow the memory without bound.
+        """
+        windows = [(key, window) for key, window in self.windows.items() if window[3] > now]
+        if len(windows) >= self.max_keys:
+            windows.sort(key=lambda item: item[1][1] + item[1][2], reverse=True)
+            windows = windows[:self.max_keys * 3 // 4]
+        self.windows = dict(windows)
+
+
+class CacheSlidingWindowCounter(object):
+    """
+    Counters in a Django cache, shared by several processes. Each window is a
+    separate cache key, that is incremented atomically.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hit(self, key, limit, duration, now):
+        number, elapsed = divmod(now, duration)
+        current_key = '%s:%d' % (key, number)
+        previous_key = '%s:%d' % (key, number - 1)
+
+        counts = self.cache.get_many([previous_key, current_key])
+        previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+        if estimate(previous, current, elapsed, duration) >= limit:
+            return False, get_wait(previous, current, elapsed, limit, duration)
+
+        # concurrent requests may overshoot the limit a little bit, which is fine for throttling
+        if not self.cache.add(current_key, 1, timeout=int(2 * duration)):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # expired between add() and incr()
+                self.cache.add(current_key, 1, timeout=int(2 * duration))
+        return True, None
+
+
+local_counter = LocalSlidingWindowCounter()
+
+
+def get_counter():
+    alias = getattr(settings, 'THROTTLE_CACHE', None)
+    if alias is None:
+        return local_counter
+    return CacheSlidingWindowCounter(caches[alias])
+
+
+class ScopedSlidingWindowThrottle(BaseThrottle):
+    """
+    Throttles auth, list and write requests with separate rates per client.
+    """
+    timer = time.time
+
+    def __init__(self):
+        self.wait_time = None
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is not None:
+            return scope
+        if request.method not in SAFE_METHODS:
+            return 'write'
+        if getattr(view, 'action', None) == 'list':
+            return 'list'
+        return None
+
+    def get_client_key(self, request):
+        if request.auth is not None:
+            return 'token:%s' % request.auth.key
+
+        user = request.user
+        if user is not None and user.is_authenticated():
+            return 'user:%s' % user.pk
+
+        return 'ip:%s' % self.get_ident(request)
+
+    def get_username_key(self, request):
+        data = request.data
+        username = data.get('username') if hasattr(data, 'get') else None
+        if not username or not isinstance(username, six.string_types):
+            return None
+        # usernames are chosen by clients and may not be valid cache keys
+        return 'username:%s' % hashlib.sha1(username.encode('utf-8')).hexdigest()
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope is not None else None
+        if rate is None:
+            return True
+
+        keys = [self.get_client_key(request)]
+        if scope == 'auth':
+            keys.append(self.get_username_key(request))
+
+        limit, duration = parse_rate(rate)
+        counter, now = get_counter(), self.timer()
+        for key in keys:
+            if key is None:
+                continue
+            allowed, self.wait_time = counter.hit('throttle:%s:%s' % (scope, key), limit, duration, now)
+            if not allowed:
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_time
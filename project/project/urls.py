@@ -3,10 +3,12 @@ from django.conf.urls.static import static
 from django.conf.urls import include, url
 from django.contrib import admin
 
-from app.views import *
-from users.views import *
+from app.views import index_view, ToolViewSet, AuthorViewSet, BookViewSet
+from users.views import UserViewSet, ObtainAuthToken
 
+from project.metrics_api import MetricsView
 from project.routers import HybridRouter
+from project.staticfiles import serve
 
 
 # We use a single global DRF Router that routes views from all apps in project
@@ -18,6 +20,7 @@ router.register(r'author', AuthorViewSet, r"author")
 router.register(r'book', BookViewSet, r"book")
 router.register(r'user', UserViewSet, r"user")
 router.add_api_view(r'auth', url(r'^auth/$', ObtainAuthToken.as_view(), name=r"auth"))
+router.add_api_view(r'metrics', url(r'^metrics/$', MetricsView.as_view(), name=r"metrics"))
 
 
 urlpatterns = [
@@ -31,6 +34,6 @@ urlpatterns = [
     url(r'^$', index_view, {}, name='index'),
 ]
 
-# let django built-in server serve static and media content
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+# let django built-in server serve static (precompressed, if possible) and media content
+urlpatterns += static(settings.STATIC_URL, view=serve, document_root=settings.STATIC_ROOT)
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -3,7 +3,13 @@ from __future__ import print_function
 from rest_framework import status, exceptions
 from rest_framework.authentication import get_authorization_header, BaseAuthentication
 
-from users.models import Token
+from bson.dbref import DBRef
+
+from project.metrics import auth_requests
+from users.models import Token, ProjectedToken, ProjectedUser
+
+token_successes = auth_requests.labels('token', 'success')
+token_failures = auth_requests.labels('token', 'failure')
 
 
 class TokenAuthentication(BaseAuthentication):
@@ -50,18 +56,28 @@ class TokenAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token)
 
     def authenticate_credentials(self, key):
+        """
+        Returns (ProjectedUser, ProjectedToken). Both documents are read with
+        projected queries, the full User is loaded only if a view needs more
+        than the fields of ProjectedUser.
+        """
         model = self.get_model()
-        try:
-            # In Mongonengine we don't need to explicitly call select_related()
-            # as opposed to Django ORM.
-            token = model.objects.get(key=key)
-        except model.DoesNotExist:
+        token = model.objects(key=key).only(*ProjectedToken.fields).as_pymongo().first()
+        if token is None:
+            token_failures.inc()
             raise exceptions.AuthenticationFailed('Invalid token.')
 
-        if not token.user.is_active:
+        user_id = token.get('user')
+        if isinstance(user_id, DBRef):
+            user_id = user_id.id
+
+        user = ProjectedUser.get(user_id) if user_id is not None else None
+        if user is None or not user.is_active:
+            token_failures.inc()
             raise exceptions.AuthenticationFailed('User inactive or deleted.')
 
-        return (token.user, token)
+        token_successes.inc()
+        return (user, ProjectedToken(key, user, token.get('created')))
 
     def authenticate_header(self, request):
         return 'Token'
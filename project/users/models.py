@@ -13,6 +13,8 @@ import mongoengine
 from mongoengine.django import auth
 from mongoengine import fields, Document, ImproperlyConfigured
 
+from project.metrics import auth_full_user_loads
+
 
 class User(Document):
     """
@@ -195,6 +197,83 @@ class User(Document):
         return self._profile_cache
 
 
+@python_2_unicode_compatible
+class ProjectedUser(object):
+    """
+    Lightweight request user, loaded with a projected query of the fields,
+    that authentication and permission checks need.
+
+    Any other attribute is taken from the full User document, which is
+    loaded on first access to such an attribute.
+    """
+    __slots__ = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', '_user')
+
+    fields = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+    def __init__(self, id, username, is_active=True, is_staff=False, is_superuser=False):
+        self.id = id
+        self.username = username
+        self.is_active = is_active
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self._user = None
+
+    @classmethod
+    def get(cls, pk):
+        """
+        Returns a ProjectedUser with the given primary key or None, if there is no such user.
+        """
+        son = User.objects(pk=pk).only(*cls.fields).as_pymongo().first()
+        if son is None:
+            return None
+        # as_pymongo() strips _id from the projected document
+        return cls(
+            pk,
+            son.get('username'),
+            is_active=son.get('is_active', True),
+            is_staff=son.get('is_staff', False),
+            is_superuser=son.get('is_superuser', False)
+        )
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def user(self):
+        """
+        Full User document.
+        """
+        if self._user is None:
+            auth_full_user_loads.inc()
+            self._user = User.objects.get(pk=self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # called only for attributes, missing from slots and class
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return isinstance(other, (ProjectedUser, User)) and self.pk == other.pk
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.username
+
+    def is_anonymous(self):
+        return False
+
+    def is_authenticated(self):
+        return True
+
+
 @python_2_unicode_compatible
 class Token(Document):
     """
@@ -216,3 +295,31 @@ class Token(Document):
 
     def __str__(self):
         return self.key
+
+
+@python_2_unicode_compatible
+class ProjectedToken(object):
+    """
+    Lightweight request.auth of TokenAuthentication with the same attributes
+    as a Token: its key, creation time and user, which is a ProjectedUser.
+    """
+    __slots__ = ('key', 'user', 'created')
+
+    fields = ('user', 'created')
+
+    def __init__(self, key, user, created=None):
+        self.key = key
+        self.user = user
+        self.created = created
+
+    def __eq__(self, other):
+        return isinstance(other, (ProjectedToken, Token)) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return self.key
@@ -4,6 +4,7 @@ from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 from rest_framework_mongoengine.serializers import DocumentSerializer
 
+from project.metrics_api import TimedSerializerMixin
 from users.models import User
 
 
@@ -36,7 +37,7 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class UserSerializer(DocumentSerializer):
+class UserSerializer(TimedSerializerMixin, DocumentSerializer):
     id = serializers.IntegerField(read_only=False)
 
     class Meta:
@@ -1,8 +1,10 @@
 from rest_framework.test import APIClient, APITestCase
-from rest_framework import status
+from rest_framework import status, exceptions
 from rest_framework.reverse import reverse
 
+from project.throttling import local_counter
 from users.models import *
+from users.authentication import TokenAuthentication
 
 
 def create_superuser():
@@ -66,6 +68,39 @@ class ObtainAuthTokenTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class ObtainAuthTokenThrottlingTestCase(APITestCase):
+    # the auth scope allows 20 requests per minute
+    limit = 20
+
+    def setUp(self):
+        self.url = reverse("api:auth")
+        local_counter.windows.clear()
+
+    def doCleanups(self):
+        local_counter.windows.clear()
+
+    def post(self, username, remote_addr, forwarded_for=None):
+        extra = {'REMOTE_ADDR': remote_addr}
+        if forwarded_for is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded_for
+        return APIClient().post(self.url, {"username": username, "password": "wrong"}, **extra)
+
+    def test_forwarded_for_is_ignored(self):
+        responses = [
+            self.post('user%d@example.com' % i, '10.0.0.1', '192.168.0.%d' % i) for i in range(self.limit + 1)
+        ]
+
+        self.assertEqual([response.status_code for response in responses[:-1]], [400] * self.limit)
+        self.assertEqual(responses[-1].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_username_is_throttled(self):
+        responses = [self.post('user@example.com', '10.0.1.%d' % i) for i in range(self.limit + 1)]
+
+        self.assertEqual(responses[-2].status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(responses[-1].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.post('other@example.com', '10.0.2.1').status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class UserViewSetTestCase(APITestCase):
     def setUp(self):
         self.new_user = create_user()
@@ -89,3 +124,37 @@ class UserViewSetTestCase(APITestCase):
 
         response = c.get(self.url, HTTP_AUTHORIZATION=self.auth_header)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        self.new_user = create_user()
+        self.key = '2c7e9e9465e917dcd34e620193ed2a7447140e5b'
+
+        Token.objects.create(key=self.key, user=self.new_user)
+
+    def doCleanups(self):
+        User.drop_collection()
+        Token.drop_collection()
+
+    def test_projected_user(self):
+        user, token = TokenAuthentication().authenticate_credentials(self.key)
+
+        self.assertIsInstance(user, ProjectedUser)
+        self.assertEqual(user, self.new_user)
+        self.assertIsInstance(token, ProjectedToken)
+        self.assertEqual(token, Token.objects.get(key=self.key))
+        self.assertIs(token.user, user)
+        self.assertIsNotNone(token.created)
+        self.assertIsNone(user._user)
+
+        # full document is loaded on access to a field, missing from the projection
+        self.assertEqual(user.email, "user@example.com")
+        self.assertIsInstance(user._user, User)
+
+    def test_inactive_user(self):
+        self.new_user.is_active = False
+        self.new_user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            TokenAuthentication().authenticate_credentials(self.key)
@@ -6,6 +6,7 @@ from rest_framework import parsers, renderers
 from users.serializers import *
 from users.models import *
 from users.authentication import TokenAuthentication
+from project.metrics import auth_requests
 
 
 class UserViewSet(mixins.ListModelMixin,
@@ -23,7 +24,7 @@ class UserViewSet(mixins.ListModelMixin,
 
 
 class ObtainAuthToken(views.APIView):
-    throttle_classes = ()
+    throttle_scope = 'auth'
     permission_classes = ()
     authentication_classes = (TokenAuthentication, )
     # parser_classes = (parsers.FormParser, parsers.MultiPartParser, parsers.JSONParser,)
@@ -32,7 +33,10 @@ class ObtainAuthToken(views.APIView):
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            auth_requests.labels('password', 'failure').inc()
+            raise exceptions.ValidationError(serializer.errors)
+        auth_requests.labels('password', 'success').inc()
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
         return Response({'token': token.key})